@@ -339,7 +339,21 @@ impl ProcDockerStats {
         Ok(())
     }
 
-    fn run(&mut self) {
+    fn run_cycle(&mut self) {
+        let _ = self.update_dockerstats_command();
+        let datetimeobj = Utc::now().format("%Y-%m-%d %H:%M:%S%.6f").to_string(); // Match Python str(datetime)
+        let _ = self.update_state_db("DOCKER_STATS|LastUpdateTime", "lastupdate", &datetimeobj);
+
+        let _ = self.update_processstats_command();
+        let _ = self.update_state_db("PROCESS_STATS|LastUpdateTime", "lastupdate", &datetimeobj);
+
+        let _ = self.update_fipsstats_command();
+        let _ = self.update_state_db("FIPS_STATS|LastUpdateTime", "lastupdate", &datetimeobj);
+    }
+
+    /// Collect every UPDATE_INTERVAL seconds, or a single time when `once` is set
+    /// (used by the parity harness in tests/procdockerstatsd_parity.py)
+    fn run(&mut self, once: bool) {
         // Check root privileges like Python version
         if unsafe { libc::getuid() } != 0 {
             error!("Must be root to run this daemon");
@@ -349,16 +363,10 @@ impl ProcDockerStats {
         info!("Started procdockerstatsd daemon");
 
         loop {
-            let _ = self.update_dockerstats_command();
-            let datetimeobj = Utc::now().format("%Y-%m-%d %H:%M:%S%.6f").to_string(); // Match Python str(datetime)
-            let _ = self.update_state_db("DOCKER_STATS|LastUpdateTime", "lastupdate", &datetimeobj);
-
-            let _ = self.update_processstats_command();
-            let _ = self.update_state_db("PROCESS_STATS|LastUpdateTime", "lastupdate", &datetimeobj);
-
-            let _ = self.update_fipsstats_command();
-            let _ = self.update_state_db("FIPS_STATS|LastUpdateTime", "lastupdate", &datetimeobj);
-
+            self.run_cycle();
+            if once {
+                break;
+            }
             sleep(Duration::from_secs(UPDATE_INTERVAL));
         }
     }
@@ -383,8 +391,10 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
 
     info!("Starting up procdockerstatsd daemon");
 
+    let once = std::env::args().skip(1).any(|arg| arg == "--once");
+
     let mut daemon = ProcDockerStats::new()?;
-    daemon.run();
+    daemon.run(once);
     Ok(())
 }
 
@@ -53,6 +53,14 @@ class MockConfigDb(object):
     def set_entry(self, key, field, data):
         MockConfigDb.CONFIG_DB[key][field] = data
 
+    def mod_config(self, data):
+        for table_name, table_data in data.items():
+            for key, fields in table_data.items():
+                if fields is None:
+                    MockConfigDb.CONFIG_DB.get(table_name, {}).pop(key, None)
+                else:
+                    MockConfigDb.CONFIG_DB.setdefault(table_name, {}).setdefault(key, {}).update(fields)
+
     def get_table(self, table_name):
         data = {}
         if table_name in MockConfigDb.CONFIG_DB:
@@ -60,6 +68,17 @@ class MockConfigDb(object):
                 data[self.deserialize_key(k)] = v
         return data
 
+    def raw_to_typed(self, raw_data):
+        typed_data = {}
+        for key, value in raw_data.items():
+            if key == "NULL":
+                continue
+            if key.endswith("@") and isinstance(value, str):
+                typed_data[key[:-1]] = value.split(',')
+            else:
+                typed_data[key] = value
+        return typed_data
+
     def subscribe(self, table_name, callback):
         self.handlers[table_name] = callback
 
@@ -100,6 +119,10 @@ class MockSelect():
         self.sub_map[subscriber.table] = subscriber
 
     def select(self, TIMEOUT):
+        for subscriber in self.sub_map.values():
+            # The initial contents of a table are pending without any event
+            if getattr(subscriber, 'initial', None):
+                return "OBJECT", subscriber
         if not MockSelect.get_event_queue() and MockSelect.NUM_TIMEOUT_TRIES == 0:
             raise TimeoutError
         elif MockSelect.NUM_TIMEOUT_TRIES != 0:
@@ -127,8 +150,10 @@ class MockSubscriberStateTable():
 
     def __init__(self, conn, table, pop=None, pri=None):
         self.fd = MockSubscriberStateTable.generate_fd()
-        self.next_key = ''
+        self.next_key = None
         self.table = table
+        # Like swsscommon, the existing keys of the table are queued as SET on construction
+        self.initial = [(key, "SET", fvs) for key, fvs in ((MockConfigDb.CONFIG_DB or {}).get(table) or {}).items()]
 
     def getFd(self):
         return self.fd
@@ -138,6 +163,8 @@ class MockSubscriberStateTable():
         self.next_key = key
 
     def pop(self):
+        if self.initial:
+            return self.initial.pop(0)
         table = MockConfigDb.CONFIG_DB.get(self.table, {})
         print(self.next_key)
         if self.next_key not in table:
@@ -148,6 +175,24 @@ class MockSubscriberStateTable():
             fvs = table.get(self.next_key, {})
         return self.next_key, op, fvs
 
+    def pops(self):
+        # The initial contents are popped first, they are pending without any event
+        entries, self.initial = self.initial, []
+        if self.next_key is None:
+            return entries
+        # Like the redis notifications, all the queued keys of this table are popped at once
+        entries.append(self.pop())
+        remaining = []
+        for table, key in MockSelect.get_event_queue():
+            if table == self.table:
+                self.nextKey(key)
+                entries.append(self.pop())
+            else:
+                remaining.append((table, key))
+        MockSelect.set_event_queue(remaining)
+        self.next_key = None
+        return entries
+
 
 class MockDBConnector():
     def __init__(self, db, val, tcpFlag=False, name=None):
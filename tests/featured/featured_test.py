@@ -27,11 +27,13 @@ sys.path.insert(0, modules_path)
 featured_path = os.path.join(scripts_path, 'featured')
 featured = load_module_from_source('featured', featured_path)
 featured.ConfigDBConnector = MockConfigDb
+featured.ConfigDBPipeConnector = MockConfigDb
 featured.DBConnector = MockDBConnector
 featured.Table = mock.Mock()
 swsscommon.Select = MockSelect
 swsscommon.SubscriberStateTable = MockSubscriberStateTable
 swsscommon.RestartWaiter = MockRestartWaiter
+swsscommon.RedisPipeline = mock.Mock()
 
 def syslog_side_effect(pri, msg): 
     print(f"{pri}: {msg}")
@@ -166,6 +168,7 @@ class TestFeatureHandler(TestCase):
                             assert is_any_difference, "'FEATURE' table in 'CONFIG_DB' is modified unexpectedly!"
 
                             if 'num_npu' in config_data:
+                                assert feature_handler.wait_namespaces_connected(timeout=5)
                                 for ns in range(config_data['num_npu']):
                                     namespace = "asic{}".format(ns)
                                     is_any_difference = self.checks_config_table(feature_handler.ns_cfg_db[namespace].get_config_db()['FEATURE'],
@@ -179,7 +182,8 @@ class TestFeatureHandler(TestCase):
                                                                           any_order=True)
                             mocked_subprocess.run.assert_has_calls(config_data['daemon_reload_subprocess_call'],
                                                                           any_order=True)
-                            feature_state_table_mock.set.assert_has_calls(feature_table_state_db_calls)
+                            # The features are enabled concurrently, so they complete in any order
+                            feature_state_table_mock.set.assert_has_calls(feature_table_state_db_calls, any_order=True)
                             self.checks_systemd_config_file(device_type, config_data['config_db']['FEATURE'], feature_systemd_name_map)
 
     @parameterized.expand(FEATURED_TEST_VECTOR)
@@ -261,6 +265,7 @@ class TestFeatureHandler(TestCase):
         assert not swss_feature.has_per_asic_scope
     
     @mock.patch('featured.FeatureHandler.update_systemd_config', mock.MagicMock())
+    @mock.patch('featured.FeatureHandler.reload_systemd_config', mock.MagicMock())
     @mock.patch('featured.FeatureHandler.update_feature_state', mock.MagicMock())
     @mock.patch('featured.FeatureHandler.sync_feature_scope', mock.MagicMock())
     @mock.patch('featured.FeatureHandler.sync_feature_delay_state', mock.MagicMock())
@@ -282,15 +287,15 @@ class TestFeatureHandler(TestCase):
         }
         mock_db.get_entry.return_value = None
         feature_handler.sync_state_field(feature_table)
-        mock_db.mod_entry.assert_called_with('FEATURE', 'sflow', {'state': 'enabled'})
-        mock_db.mod_entry.reset_mock()
+        mock_db.mod_config.assert_called_with({'FEATURE': {'sflow': {'state': 'enabled'}}})
+        mock_db.mod_config.reset_mock()
 
         feature_handler = featured.FeatureHandler(mock_db, mock_feature_state_table, {}, False)
         mock_db.get_entry.return_value = {
             'state': 'disabled',
         }
         feature_handler.sync_state_field(feature_table)
-        mock_db.mod_entry.assert_not_called()
+        mock_db.mod_config.assert_not_called()
 
         feature_handler = featured.FeatureHandler(mock_db, mock_feature_state_table, {}, False)
         feature_table = {
@@ -303,8 +308,8 @@ class TestFeatureHandler(TestCase):
             }
         }
         feature_handler.sync_state_field(feature_table)
-        mock_db.mod_entry.assert_called_with('FEATURE', 'sflow', {'state': 'always_enabled'})
-        mock_db.mod_entry.reset_mock()
+        mock_db.mod_config.assert_called_with({'FEATURE': {'sflow': {'state': 'always_enabled'}}})
+        mock_db.mod_config.reset_mock()
 
         feature_handler = featured.FeatureHandler(mock_db, mock_feature_state_table, {}, False)
         mock_db.get_entry.return_value = {
@@ -320,7 +325,7 @@ class TestFeatureHandler(TestCase):
             }
         }
         feature_handler.sync_state_field(feature_table)
-        mock_db.mod_entry.assert_called_with('FEATURE', 'sflow', {'state': 'enabled'})
+        mock_db.mod_config.assert_called_with({'FEATURE': {'sflow': {'state': 'enabled'}}})
     
     def test_port_init_done_twice(self):
         """There could be multiple "PortInitDone" event in case of swss
@@ -377,6 +382,261 @@ class TestFeatureHandler(TestCase):
             assert any("ExclusionList: skip disabling 'frr_bmp'" in str(c.args[1]) for c in mock_syslog.call_args_list)
 
 
+    @mock.patch("syslog.syslog", side_effect=syslog_side_effect)
+    def test_enable_feature_batched_per_unit_failure(self, mock_syslog):
+        """Verify the instances of a feature are handled by one systemctl command per verb,
+        and the failing instance is found out and reported on failure."""
+        feature_state_table_mock = mock.Mock()
+        handler = featured.FeatureHandler(MockConfigDb(), feature_state_table_mock, {}, False)
+        feature = featured.Feature("bgp", {"state": "enabled"})
+        units = ["bgp@0.service", "bgp@1.service"]
+
+        def run_cmd_side_effect(cmd, log_err=True, raise_exception=False):
+            if cmd[2] == "start" and "bgp@1.service" in cmd:
+                raise Exception("Command failed")
+
+        with mock.patch.object(handler, "get_multiasic_feature_instances",
+                               return_value=(["bgp@0", "bgp@1"], ["service"])), \
+            mock.patch.object(handler, "get_systemd_unit_state", return_value="disabled"), \
+            mock.patch("featured.run_cmd", side_effect=run_cmd_side_effect) as mocked_run_cmd:
+
+            assert not handler.enable_feature(feature)
+            handler.flush()
+
+            assert mocked_run_cmd.call_args_list == [
+                call(["sudo", "systemctl", "unmask"] + units, raise_exception=True),
+                call(["sudo", "systemctl", "enable"] + units, raise_exception=True),
+                call(["sudo", "systemctl", "start"] + units, raise_exception=True),
+                call(["sudo", "systemctl", "start", "bgp@0.service"], raise_exception=True),
+                call(["sudo", "systemctl", "start", "bgp@1.service"], raise_exception=True)]
+            feature_state_table_mock.set.assert_called_with("bgp", [("state", "failed")])
+            assert any("Feature 'bgp@1.service' failed to be enabled and started" in str(c.args[1])
+                       for c in mock_syslog.call_args_list)
+            assert not any("Feature 'bgp@0.service' failed" in str(c.args[1])
+                           for c in mock_syslog.call_args_list)
+
+
+    def run_update_features_state(self, handler, features, show_output, failing=()):
+        """ update_features_state with a mocked ordering, returns (results, completion order, concurrency peak) """
+        started = set()
+        order = []
+        lock = featured.threading.Lock()
+        concurrent_peak = []
+
+        def update_feature_state(feature):
+            with lock:
+                started.add(feature.name)
+                concurrent_peak.append(len(started))
+            time.sleep(0.05)
+            with lock:
+                started.discard(feature.name)
+                order.append(feature.name)
+            return feature.name not in failing
+
+        with mock.patch('featured.subprocess') as mocked_subprocess, \
+            mock.patch.object(handler, 'update_feature_state', side_effect=update_feature_state):
+            popen_mock = mock.Mock()
+            popen_mock.configure_mock(**{'communicate.return_value': (show_output, b''), 'returncode': 0})
+            mocked_subprocess.Popen.return_value = popen_mock
+
+            results = handler.update_features_state(features)
+
+            mocked_subprocess.Popen.assert_called_once()
+        return results, order, max(concurrent_peak)
+
+    def test_update_features_state_ordering(self):
+        """Verify independent features are enabled concurrently, and a feature waits
+        for the features its units are ordered after."""
+        handler = featured.FeatureHandler(MockConfigDb(), mock.Mock(), {}, False)
+        features = [featured.Feature(name, {'state': 'enabled'}) for name in ('bgp', 'swss', 'lldp', 'snmp', 'radv')]
+        show_output = (b"Id=bgp.service\nAfter=swss.service basic.target\nBefore=\n\n"
+                       b"Id=swss.service\nAfter=basic.target\nBefore=radv.service\n\n"
+                       b"Id=lldp.service\nAfter=\nBefore=\n\n"
+                       b"Id=snmp.service\nAfter=swss.service bgp.service\nBefore=\n\n"
+                       b"Id=radv.service\nAfter=\nBefore=\n")
+
+        results, order, peak = self.run_update_features_state(handler, features, show_output, failing=('lldp',))
+
+        assert results == {'bgp': True, 'swss': True, 'lldp': False, 'snmp': True, 'radv': True}
+        assert order.index('swss') < order.index('bgp') < order.index('snmp')
+        # Ordered by the Before= of swss
+        assert order.index('swss') < order.index('radv')
+        # swss and lldp are independent
+        assert peak >= 2
+
+    def test_update_features_state_stop_ordering(self):
+        """Verify the dependent features are stopped first, and stopped before the
+        features ordered with them are started."""
+        handler = featured.FeatureHandler(MockConfigDb(), mock.Mock(), {}, False)
+        features = [featured.Feature('swss', {'state': 'disabled'}),
+                    featured.Feature('bgp', {'state': 'disabled'}),
+                    featured.Feature('teamd', {'state': 'enabled'}),
+                    featured.Feature('dhcp_relay', {'state': 'disabled'})]
+        show_output = (b"Id=swss.service\nAfter=\nBefore=\n\n"
+                       b"Id=bgp.service\nAfter=swss.service\nBefore=\n\n"
+                       b"Id=teamd.service\nAfter=\nBefore=\n\n"
+                       b"Id=dhcp_relay.service\nAfter=teamd.service\nBefore=\n")
+
+        results, order, _ = self.run_update_features_state(handler, features, show_output)
+
+        assert all(results.values())
+        assert order.index('bgp') < order.index('swss')
+        assert order.index('dhcp_relay') < order.index('teamd')
+
+    def test_namespace_db_connected_in_background(self):
+        """Verify the namespace DBs are connected in background with retries, and the
+        writes made before the connection are replayed."""
+        connected = featured.threading.Event()
+        cfg_dbs = []
+
+        def make_cfg_db(namespace):
+            cfg_db = mock.MagicMock()
+            if not cfg_dbs:
+                cfg_db.connect.side_effect = Exception('database not ready')
+            else:
+                cfg_db.connect.side_effect = lambda **kwargs: connected.wait(5)
+            cfg_dbs.append(cfg_db)
+            return cfg_db
+
+        with mock.patch("sonic_py_common.device_info.is_multi_npu", return_value=True), \
+            mock.patch("sonic_py_common.device_info.get_namespaces", return_value=['asic0']), \
+            mock.patch.object(featured, 'SonicDBConfig'), \
+            mock.patch.object(featured, 'ConfigDBPipeConnector', side_effect=make_cfg_db), \
+            mock.patch.object(featured, 'Table') as mocked_table, \
+            mock.patch('featured.time.sleep') as mocked_sleep:
+            handler = featured.FeatureHandler(MockConfigDb(), mock.Mock(), {}, False)
+            feature = featured.Feature('bgp', {'state': 'enabled'})
+
+            # The host features are handled before the namespace is connected
+            handler.set_feature_state(feature, 'enabled')
+            handler.mod_feature_entry('bgp', {'state': 'enabled'})
+            handler.flush()
+            assert not handler.ns_cfg_db
+
+            connected.set()
+            assert handler.wait_namespaces_connected(timeout=5)
+            mocked_sleep.assert_called_once_with(featured.NS_DB_RETRY_INTERVAL_SEC)
+            assert handler.ns_cfg_db == {'asic0': cfg_dbs[1]}
+            cfg_dbs[1].mod_config.assert_called_once_with({'FEATURE': {'bgp': {'state': 'enabled'}}})
+            mocked_table.return_value.set.assert_called_once_with('bgp', [('state', 'enabled')])
+            mocked_table.return_value.flush.assert_called_once()
+
+    def test_namespace_pending_writes_of_removed_feature(self):
+        """Verify the writes are made without blocking the workers' buffers, and the pending
+        namespace writes of a feature removed meanwhile are dropped."""
+        connected = featured.threading.Event()
+        cfg_db = mock.MagicMock()
+        cfg_db.connect.side_effect = lambda **kwargs: connected.wait(5)
+
+        with mock.patch("sonic_py_common.device_info.is_multi_npu", return_value=True), \
+            mock.patch("sonic_py_common.device_info.get_namespaces", return_value=['asic0']), \
+            mock.patch.object(featured, 'SonicDBConfig'), \
+            mock.patch.object(featured, 'ConfigDBPipeConnector', return_value=cfg_db), \
+            mock.patch.object(featured, 'Table'):
+            host_db = mock.MagicMock()
+            handler = featured.FeatureHandler(host_db, mock.MagicMock(), {}, False)
+            host_db.mod_config.side_effect = lambda data: self.assertFalse(handler._state_lock.locked())
+
+            handler.mod_feature_entry('bgp', {'state': 'enabled'})
+            handler.mod_feature_entry('snmp', {'state': 'enabled'})
+            handler.flush()
+            host_db.mod_config.assert_called_once()
+            handler.handler('bgp', 'DEL', {})
+
+            connected.set()
+            assert handler.wait_namespaces_connected(timeout=5)
+            cfg_db.mod_config.assert_called_once_with({'FEATURE': {'snmp': {'state': 'enabled'}}})
+
+    def test_feature_updates_write_behind(self):
+        """Verify the FEATURE updates are buffered and written at once per database on flush."""
+        mock_db = mock.MagicMock()
+        mock_db.get_entry.return_value = {'state': 'enabled', 'delayed': 'False'}
+        feature_state_table = mock.MagicMock()
+        handler = featured.FeatureHandler(mock_db, feature_state_table, {}, False)
+        feature = featured.Feature('bgp', {'state': 'always_enabled', 'delayed': 'True'})
+
+        handler.set_feature_state(feature, 'failed')
+        handler.set_feature_state(feature, 'enabled')
+        handler.resync_feature_state(feature)
+        handler.sync_feature_delay_state(feature)
+        # The reads see the buffered updates
+        assert handler.get_feature_entry('bgp') == {'state': 'always_enabled', 'delayed': 'True'}
+        mock_db.mod_config.assert_not_called()
+        feature_state_table.set.assert_not_called()
+
+        handler.flush()
+        mock_db.mod_config.assert_called_once_with({'FEATURE': {'bgp': {'state': 'always_enabled', 'delayed': 'True'}}})
+        mock_db.mod_entry.assert_not_called()
+        feature_state_table.set.assert_called_once_with('bgp', [('state', 'enabled')])
+        feature_state_table.flush.assert_called_once()
+
+        # Nothing buffered, nothing written
+        handler.flush()
+        mock_db.mod_config.assert_called_once()
+
+    def test_systemd_unit_states_snapshot(self):
+        """Verify the unit states are looked up in the D-Bus snapshot and kept current by the signals."""
+        with mock.patch.object(featured, 'dbus', create=True) as mock_dbus, \
+            mock.patch.object(featured, 'GLib', create=True), \
+            mock.patch('featured.subprocess') as mocked_subprocess:
+            mock_dbus.exceptions.DBusException = Exception
+            manager = mock_dbus.Interface.return_value
+            manager.ListUnitFiles.return_value = [('/lib/systemd/system/bgp@.service', 'enabled'),
+                                                  ('/etc/systemd/system/lldp.service', 'masked')]
+            manager.GetUnitFileState.return_value = 'enabled'
+
+            unit_states = featured.SystemdUnitStates()
+            handler = featured.FeatureHandler(MockConfigDb(), mock.Mock(), {}, False, unit_states)
+
+            assert handler.get_systemd_unit_state('lldp.service') == 'masked'
+            # Instances are not listed, they are queried once
+            assert handler.get_systemd_unit_state('bgp@0.service') == 'enabled'
+            assert handler.get_systemd_unit_state('bgp@0.service') == 'enabled'
+            manager.GetUnitFileState.assert_called_once_with('bgp@0.service')
+            manager.ListUnitFiles.assert_called_once()
+
+            unit_states.properties_changed('org.freedesktop.systemd1.Unit', {'UnitFileState': 'disabled'}, [],
+                                           path='/org/freedesktop/systemd1/unit/bgp_400_2eservice')
+            assert handler.get_systemd_unit_state('bgp@0.service') == 'disabled'
+
+            # Unknown unit
+            manager.GetUnitFileState.side_effect = Exception('NoSuchUnit')
+            assert handler.get_systemd_unit_state('foo.service') == ''
+
+            unit_states.unit_files_changed()
+            assert handler.get_systemd_unit_state('lldp.service') == 'masked'
+            assert manager.ListUnitFiles.call_count == 2
+            mocked_subprocess.Popen.assert_not_called()
+
+    def test_systemd_unit_states_serialized(self):
+        """Verify the D-Bus calls of concurrent lookups are not made at the same time."""
+        with mock.patch.object(featured, 'dbus', create=True) as mock_dbus, \
+            mock.patch.object(featured, 'GLib', create=True):
+            mock_dbus.exceptions.DBusException = Exception
+            manager = mock_dbus.Interface.return_value
+            manager.ListUnitFiles.return_value = []
+            lock = featured.threading.Lock()
+            in_call = []
+            overlaps = []
+
+            def get_unit_file_state(unit):
+                with lock:
+                    overlaps.append(len(in_call))
+                    in_call.append(unit)
+                time.sleep(0.01)
+                with lock:
+                    in_call.remove(unit)
+                return 'enabled'
+            manager.GetUnitFileState.side_effect = get_unit_file_state
+
+            unit_states = featured.SystemdUnitStates()
+            units = ['bgp@{}.service'.format(i) for i in range(8)]
+            with featured.concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                assert list(executor.map(unit_states.get, units)) == ['enabled'] * len(units)
+            assert manager.GetUnitFileState.call_count == len(units)
+            assert max(overlaps) == 0
+
+
 @mock.patch("syslog.syslog", side_effect=syslog_side_effect)
 @mock.patch('sonic_py_common.device_info.get_device_runtime_metadata')
 class TestFeatureDaemon(TestCase):
@@ -389,13 +649,24 @@ class TestFeatureDaemon(TestCase):
         MockConfigDb.CONFIG_DB = copy.deepcopy(FEATURE_DAEMON_CFG_DB)
         MockRestartWaiter.advancedReboot = False
         MockSelect.NUM_TIMEOUT_TRIES = 0
+        # Keep the daemon off the host's systemd bus; unit states come from
+        # the mocked systemctl calls instead.
+        self.dbus_patcher = mock.patch.object(featured, 'dbus', None)
+        self.dbus_patcher.start()
 
     def tearDown(self):
         print("Running TearDown")
+        self.dbus_patcher.stop()
         self.patcher.tearDown()
         MockConfigDb.CONFIG_DB.clear()
         MockSelect.reset_event_queue()
 
+    def test_unit_states_fallback(self, mock_syslog, get_runtime):
+        with mock.patch('featured.SystemdUnitStates') as unit_states:
+            daemon = featured.FeatureDaemon()
+        unit_states.assert_not_called()
+        assert daemon.feature_handler._unit_states is None
+
     def test_feature_events(self, mock_syslog, get_runtime):
         MockSelect.set_event_queue([('FEATURE', 'dhcp_relay'),
                                     ('FEATURE', 'mux')])
@@ -415,11 +686,13 @@ class TestFeatureDaemon(TestCase):
                         call(['sudo', 'systemctl', 'unmask', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'enable', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'start', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
-                        call(['sudo', 'systemctl', 'daemon-reload'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'unmask', 'mux.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'enable', 'mux.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'start', 'mux.service'], capture_output=True, check=True, text=True)]
             mocked_subprocess.run.assert_has_calls(expected, any_order=True)
+            # The drop-ins of all the features are written first, then systemd is reloaded once
+            assert mocked_subprocess.run.call_args_list.count(
+                call(['sudo', 'systemctl', 'daemon-reload'], capture_output=True, check=True, text=True)) == 1
 
             # Change the state to disabled
             MockSelect.reset_event_queue()
@@ -456,7 +729,6 @@ class TestFeatureDaemon(TestCase):
                         call(['sudo', 'systemctl', 'unmask', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'enable', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'start', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
-                        call(['sudo', 'systemctl', 'daemon-reload'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'unmask', 'mux.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'enable', 'mux.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'start', 'mux.service'], capture_output=True, check=True, text=True)]
@@ -482,7 +754,6 @@ class TestFeatureDaemon(TestCase):
                 call(['sudo', 'systemctl', 'unmask', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'enable', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'start', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'daemon-reload'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'unmask', 'mux.service'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'enable', 'mux.service'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'start', 'mux.service'], capture_output=True, check=True, text=True)]               
@@ -510,12 +781,39 @@ class TestFeatureDaemon(TestCase):
                         call(['sudo', 'systemctl', 'unmask', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'enable', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'start', 'dhcp_relay.service'], capture_output=True, check=True, text=True),
-                        call(['sudo', 'systemctl', 'daemon-reload'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'unmask', 'mux.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'enable', 'mux.service'], capture_output=True, check=True, text=True),
                         call(['sudo', 'systemctl', 'start', 'mux.service'], capture_output=True, check=True, text=True)]
             mocked_subprocess.run.assert_has_calls(expected, any_order=True)
 
+    def test_feature_events_batched(self, mock_syslog, get_runtime):
+        """Verify the keys pending on the table are popped at once, and the updates of
+        the same key are coalesced into its last one."""
+        MockSelect.set_event_queue([('FEATURE', 'dhcp_relay'),
+                                    ('FEATURE', 'mux'),
+                                    ('FEATURE', 'dhcp_relay')])
+        with mock.patch('featured.subprocess'):
+            daemon = featured.FeatureDaemon()
+            daemon.feature_handler.handler = mock.MagicMock()
+            daemon.register_callbacks()
+            # Drop the FEATURE keys the subscriber replays on construction
+            for subscriber, _ in daemon.subscriber_map.values():
+                subscriber.pops()
+            try:
+                daemon.start(time.time())
+            except TimeoutError:
+                pass
+            daemon.feature_handler.handler.assert_has_calls([
+                call('dhcp_relay', 'SET', MockConfigDb.CONFIG_DB['FEATURE']['dhcp_relay']),
+                call('mux', 'SET', MockConfigDb.CONFIG_DB['FEATURE']['mux'])])
+            assert daemon.feature_handler.handler.call_count == 2
+
+        events = [('dhcp_relay', 'SET', {'state': 'disabled'}),
+                  ('mux', 'SET', {'state': 'enabled'}),
+                  ('dhcp_relay', 'SET', {'state': 'enabled'})]
+        assert featured.FeatureDaemon.coalesce(events) == [('dhcp_relay', 'SET', {'state': 'enabled'}),
+                                                          ('mux', 'SET', {'state': 'enabled'})]
+
     def test_systemctl_command_failure(self, mock_syslog, get_runtime):
         """Test that when systemctl commands fail:
         1. The feature state is not cached
@@ -561,6 +859,7 @@ class TestFeatureDaemon(TestCase):
                 assert result is False
 
                 # Verify the feature state was set to FAILED
+                feature_handler.flush()
                 mock_feature_state_table.set.assert_called_with('test_feature', [('state', 'failed')])
 
                 # Verify the feature state was not enabled in the cache
@@ -916,30 +916,18 @@ FEATURED_TEST_VECTOR = [
                 },
             },
             "enable_feature_subprocess_calls": [
-                call(["sudo", "systemctl", "stop", "bgp@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "disable", "bgp@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "mask", "bgp@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "stop", "bgp@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "disable", "bgp@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "mask", "bgp@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "start", "teamd@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "enable", "teamd@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "unmask", "teamd@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "start", "teamd@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "enable", "teamd@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "unmask", "teamd@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "stop", "lldp@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "disable", "lldp@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "mask", "lldp@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "stop", "lldp@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "disable", "lldp@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "mask", "lldp@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "start", "syncd@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "enable", "syncd@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "unmask", "syncd@0.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "start", "syncd@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "enable", "syncd@1.service"], capture_output=True, check=True, text=True),
-                call(["sudo", "systemctl", "unmask", "syncd@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "stop", "bgp@0.service", "bgp@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "disable", "bgp@0.service", "bgp@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "mask", "bgp@0.service", "bgp@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "unmask", "teamd@0.service", "teamd@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "enable", "teamd@0.service", "teamd@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "start", "teamd@0.service", "teamd@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "stop", "lldp@0.service", "lldp@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "disable", "lldp@0.service", "lldp@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "mask", "lldp@0.service", "lldp@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "unmask", "syncd@0.service", "syncd@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "enable", "syncd@0.service", "syncd@1.service"], capture_output=True, check=True, text=True),
+                call(["sudo", "systemctl", "start", "syncd@0.service", "syncd@1.service"], capture_output=True, check=True, text=True),
             ],
             "daemon_reload_subprocess_call": [
                 call(["sudo", "systemctl", "daemon-reload"], capture_output=True, check=True, text=True),
@@ -1057,33 +1045,21 @@ FEATURED_TEST_VECTOR = [
                 },
             },
             "enable_feature_subprocess_calls": [
-                call(['sudo', 'systemctl', 'unmask', 'bgp@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'bgp@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'bgp@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'unmask', 'bgp@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'bgp@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'bgp@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'unmask', 'teamd@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'teamd@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'teamd@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'unmask', 'teamd@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'teamd@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'teamd@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'unmask', 'bgp@0.service', 'bgp@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'enable', 'bgp@0.service', 'bgp@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'start', 'bgp@0.service', 'bgp@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'unmask', 'teamd@0.service', 'teamd@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'enable', 'teamd@0.service', 'teamd@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'start', 'teamd@0.service', 'teamd@1.service'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'mask', 'lldp.service'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'disable', 'lldp.service'], capture_output=True, check=True, text=True),
                 call(['sudo', 'systemctl', 'stop', 'lldp.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'unmask', 'lldp@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'lldp@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'lldp@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'unmask', 'lldp@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'lldp@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'lldp@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'unmask', 'macsec@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'macsec@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'macsec@0.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'unmask', 'macsec@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'enable', 'macsec@1.service'], capture_output=True, check=True, text=True),
-                call(['sudo', 'systemctl', 'start', 'macsec@1.service'], capture_output=True, check=True, text=True)
+                call(['sudo', 'systemctl', 'unmask', 'lldp@0.service', 'lldp@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'enable', 'lldp@0.service', 'lldp@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'start', 'lldp@0.service', 'lldp@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'unmask', 'macsec@0.service', 'macsec@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'enable', 'macsec@0.service', 'macsec@1.service'], capture_output=True, check=True, text=True),
+                call(['sudo', 'systemctl', 'start', 'macsec@0.service', 'macsec@1.service'], capture_output=True, check=True, text=True)
             ],
             "daemon_reload_subprocess_call": [
                 call(["sudo", "systemctl", "daemon-reload"], capture_output=True, check=True, text=True),
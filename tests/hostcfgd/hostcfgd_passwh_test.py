@@ -180,3 +180,48 @@ class TestHostcfgdPASSWH(TestCase):
         """
 
         self.check_config(test_name, test_data, "enable_digits_class")
+
+    def test_hostcfgd_passwh_normal_accounts_cache(self):
+        """
+            Test that the normal accounts list is built from pwd and is cached
+            until /etc/passwd or /etc/login.defs are modified.
+        """
+        op_path = output_path + "/PASSWORD_HARDENING_accounts_cache"
+        shutil.rmtree(op_path, ignore_errors=True)
+        os.mkdir(op_path)
+        shutil.copyfile(sample_output_path + "/PASSWORD_HARDENING/login.defs.old", op_path + "/login.defs")
+        hostcfgd.ETC_LOGIN_DEF = op_path + "/login.defs"
+
+        accounts = [
+            mock.Mock(pw_name='root', pw_uid=0),
+            mock.Mock(pw_name='admin', pw_uid=1000),
+            mock.Mock(pw_name='user', pw_uid=1001),
+            mock.Mock(pw_name='nobody', pw_uid=65534)
+        ]
+        passwcfg = hostcfgd.PasswHardening()
+        with mock.patch('hostcfgd.pwd.getpwall', return_value=accounts) as mocked_getpwall:
+            self.assertEqual(passwcfg.get_normal_accounts(), ['admin', 'user'])
+            self.assertEqual(passwcfg.get_normal_accounts(), ['admin', 'user'])
+            mocked_getpwall.assert_called_once()
+
+            # login.defs modification invalidates the cache
+            with open(op_path + "/login.defs", 'a') as f:
+                f.write("# modified\n")
+            self.assertEqual(passwcfg.get_normal_accounts(), ['admin', 'user'])
+            self.assertEqual(mocked_getpwall.call_count, 2)
+
+    def test_hostcfgd_passwh_aging_single_chage_per_account(self):
+        """
+            Test that max days and warn days are applied by one chage call per account
+        """
+        passwcfg = hostcfgd.PasswHardening()
+        chage_proc = mock.Mock(returncode=0)
+        chage_proc.communicate.return_value = (None, b'')
+        with mock.patch.object(passwcfg, 'get_normal_accounts', return_value=['admin', 'user']), \
+             mock.patch('hostcfgd.subprocess.Popen', return_value=chage_proc) as mocked_popen:
+            passwcfg.passwd_aging_expire_modify({'MAX_DAYS': 180, 'WARN_DAYS': 15})
+
+            self.assertEqual([c.args[0] for c in mocked_popen.call_args_list], [
+                ['chage', '-M', '180', '-W', '15', 'admin'],
+                ['chage', '-M', '180', '-W', '15', 'user']
+            ])
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+    hostcfgd config change replay harness
+
+    Loads a config_db.json snapshot into MockConfigDb, runs
+    HostConfigDaemon.load() and then feeds a stream of (table, key, data)
+    events through the registered callbacks. The stream is either recorded
+    in a json file as a list of [table, key, data] (data null is a DEL), or
+    synthesized by re-applying every entry of the snapshot.
+
+    Subprocess calls and signals are routed to a recording stub, and the
+    files hostcfgd renders or reads (the memory statistics daemon PID file)
+    are in a temporary directory. The harness reports the
+    handled events per second, the forks, restarts and file writes per event,
+    and the per table handler statistics.
+
+    Usage (from the repository root):
+        python3 -m tests.hostcfgd.hostcfgd_replay [--config config_db.json] [--events events.json]
+            [--rounds N] [--batch] [--json] [--max-forks-per-event F] [--max-writes-per-event W]
+"""
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+test_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+modules_path = os.path.dirname(test_path)
+scripts_path = os.path.join(modules_path, 'scripts')
+templates_path = os.path.join(modules_path, 'data', 'templates')
+sys.path.insert(0, modules_path)
+
+
+def load_hostcfgd():
+    """ Load scripts/hostcfgd with the swsscommon classes replaced by the test mocks """
+    from swsscommon import swsscommon
+    from sonic_py_common.general import load_module_from_source
+    from tests.common.mock_configdb import MockConfigDb, MockDBConnector, MockSubscriberStateTable, MockSelect
+
+    os.environ['HOSTCFGD_UNIT_TESTING'] = '2'
+    hostcfgd = load_module_from_source('hostcfgd', os.path.join(scripts_path, 'hostcfgd'))
+    hostcfgd.ConfigDBConnector = MockConfigDb
+    hostcfgd.DBConnector = MockDBConnector
+    hostcfgd.Table = mock.Mock()
+    swsscommon.Select = MockSelect
+    swsscommon.SubscriberStateTable = MockSubscriberStateTable
+    return hostcfgd
+
+
+def sandbox_hostcfgd(hostcfgd, work_dir):
+    """ Redirect the files hostcfgd renders or modifies into work_dir """
+    for name in ['PAM_AUTH_CONF_TEMPLATE', 'PAM_PASSWORD_CONF_TEMPLATE', 'NSS_TACPLUS_CONF_TEMPLATE',
+                 'NSS_RADIUS_CONF_TEMPLATE', 'PAM_RADIUS_AUTH_CONF_TEMPLATE', 'LDAP_CONF_TEMPLATE',
+                 'NSLCD_CONF_TEMPLATE', 'PAM_LIMITS_CONF_TEMPLATE', 'LIMITS_CONF_TEMPLATE']:
+        template = os.path.basename(getattr(hostcfgd, name))
+        setattr(hostcfgd, name, os.path.join(templates_path, template))
+
+    for name in ['PAM_AUTH_CONF', 'PAM_PASSWORD_CONF', 'SSH_CONFG', 'NSS_TACPLUS_CONF', 'NSS_RADIUS_CONF',
+                 'NSS_CONF', 'LDAP_CONF', 'NSLCD_CONF', 'PAM_SESSION_CONF', 'PAM_SESSION_NONINT_CONF',
+                 'ETC_PAMD_SSHD', 'ETC_PAMD_LOGIN', 'ETC_LOGIN_DEF', 'PAM_LIMITS_CONF', 'LIMITS_CONF',
+                 'FIPS_CONFIG_FILE', 'OPENSSL_FIPS_CONFIG_FILE']:
+        setattr(hostcfgd, name, os.path.join(work_dir, os.path.basename(getattr(hostcfgd, name))))
+    hostcfgd.SSH_CONFG_TMP = hostcfgd.SSH_CONFG + '.tmp'
+    hostcfgd.MemoryStatisticsCfg.PID_FILE_PATH = os.path.join(
+        work_dir, os.path.basename(hostcfgd.MemoryStatisticsCfg.PID_FILE_PATH))
+    hostcfgd.RADIUS_PAM_AUTH_CONF_DIR = work_dir + '/'
+    os.makedirs(os.path.dirname(hostcfgd.LDAP_CONF), exist_ok=True)
+
+
+# Audit hooks cannot be removed, so a single one, installed by the first
+# Recorder.start(), forwards the events to the recorder started last
+_recorder = None
+_audit_hook_installed = False
+
+
+def _audit(event, args):
+    recorder = _recorder
+    if recorder is not None:
+        recorder.audit(event, args)
+
+
+class Recorder(object):
+    """
+        Recording stub of the subprocess module and os.kill, and counter of
+        the files opened for writing. Counting is active only between start()
+        and stop().
+    """
+    WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+    def __init__(self):
+        self.active = False
+        self.commands = []
+        self.writes = []
+        self.signals = []
+        self.subprocess = mock.Mock()
+        self.subprocess.CalledProcessError = subprocess.CalledProcessError
+        self.subprocess.TimeoutExpired = subprocess.TimeoutExpired
+        self.subprocess.DEVNULL = subprocess.DEVNULL
+        self.subprocess.PIPE = subprocess.PIPE
+        self.subprocess.call.side_effect = self.call
+        self.subprocess.check_call.side_effect = self.call
+        self.subprocess.check_output.side_effect = self.check_output
+        self.subprocess.run.side_effect = self.run
+        self.subprocess.Popen.side_effect = self.popen
+
+    def start(self):
+        global _recorder, _audit_hook_installed
+        if not _audit_hook_installed:
+            sys.addaudithook(_audit)
+            _audit_hook_installed = True
+        self.commands = []
+        self.writes = []
+        self.signals = []
+        self.active = True
+        _recorder = self
+
+    def stop(self):
+        global _recorder
+        self.active = False
+        if _recorder is self:
+            _recorder = None
+
+    def record(self, *cmds):
+        if self.active:
+            self.commands.extend(list(cmd) for cmd in cmds)
+
+    def kill(self, pid, sig):
+        if self.active:
+            self.signals.append((pid, sig))
+
+    def call(self, cmd, *args, **kwargs):
+        self.record(cmd)
+        return 0
+
+    def check_output(self, cmd, *args, **kwargs):
+        self.record(cmd)
+        return '' if kwargs.get('text') or kwargs.get('universal_newlines') else b''
+
+    def check_output_pipe(self, *cmds):
+        self.record(*cmds)
+        return ''
+
+    def run(self, cmd, *args, **kwargs):
+        self.record(cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout=b'', stderr=b'')
+
+    def popen(self, cmd, *args, **kwargs):
+        self.record(cmd)
+        proc = mock.Mock(pid=0, returncode=0)
+        proc.communicate.return_value = (b'', b'')
+        proc.wait.return_value = 0
+        proc.poll.return_value = 0
+        return proc
+
+    def audit(self, event, args):
+        if not self.active or event != 'open':
+            return
+        path, mode, flags = args
+        if mode is not None:
+            writing = any(m in mode for m in 'wax+')
+        else:
+            writing = bool(flags & self.WRITE_FLAGS)
+        if writing and isinstance(path, (str, bytes)):
+            self.writes.append(path)
+
+    @property
+    def forks(self):
+        return len(self.commands)
+
+    @property
+    def restarts(self):
+        return len([cmd for cmd in self.commands if 'restart' in cmd])
+
+
+def synthetic_events(config_db, tables, rounds):
+    """ Re-apply every entry of the subscribed tables of the snapshot """
+    events = []
+    for _ in range(rounds):
+        for table in sorted(config_db):
+            if table not in tables:
+                continue
+            for key, data in config_db[table].items():
+                events.append((table, key, data))
+    return events
+
+
+def replay(config_db, events=None, rounds=1, batch=False):
+    """
+    Replay the events and return the report as a dict.
+    Args:
+        config_db: CONFIG_DB snapshot
+        events: list of (table, key, data), None to synthesize them from the snapshot
+        rounds: number of times the synthetic events are applied
+        batch: deliver the consecutive events of a table at once, like the Select loop
+    """
+    from tests.common.mock_configdb import MockConfigDb
+
+    hostcfgd = load_hostcfgd()
+    recorder = Recorder()
+    report = {}
+    with tempfile.TemporaryDirectory() as work_dir, \
+            mock.patch.object(hostcfgd, 'subprocess', recorder.subprocess), \
+            mock.patch.object(hostcfgd.os, 'kill', side_effect=recorder.kill), \
+            mock.patch.object(hostcfgd, 'check_output_pipe', side_effect=recorder.check_output_pipe), \
+            mock.patch.object(hostcfgd, 'handler_stats', hostcfgd.HandlerStats()):
+        sandbox_hostcfgd(hostcfgd, work_dir)
+        MockConfigDb.set_config_db(copy.deepcopy(config_db))
+
+        daemon = hostcfgd.HostConfigDaemon()
+        daemon.register_callbacks()
+        recorder.start()
+        start = time.monotonic()
+        daemon.load_initial_config()
+        report['load'] = {
+            'seconds': time.monotonic() - start,
+            'forks': recorder.forks,
+            'restarts': recorder.restarts,
+            'writes': len(recorder.writes),
+            'signals': len(recorder.signals)
+        }
+
+        if events is None:
+            events = synthetic_events(config_db, daemon.callbacks, rounds)
+
+        # Group the events into the batches delivered to the callbacks
+        batches = []
+        for table, key, data in events:
+            op = 'DEL' if data is None else 'SET'
+            entry = (key, op, {} if data is None else data)
+            if batch and batches and batches[-1][0] == table:
+                batches[-1][1].append(entry)
+            else:
+                batches.append((table, [entry]))
+
+        errors = 0
+        recorder.start()
+        start = time.monotonic()
+        for table, entries in batches:
+            cfg_table = MockConfigDb.CONFIG_DB.setdefault(table, {})
+            for key, op, data in entries:
+                if op == 'DEL':
+                    cfg_table.pop(key, None)
+                else:
+                    cfg_table[key] = copy.deepcopy(data)
+            try:
+                daemon.handle_events(table, copy.deepcopy(entries))
+            except Exception as e:
+                errors += 1
+                print('{}: {} failed: {}: {}'.format(table, [e[0] for e in entries], type(e).__name__, e),
+                      file=sys.stderr)
+        elapsed = time.monotonic() - start
+        recorder.stop()
+
+        count = len(events)
+        report['events'] = {
+            'count': count,
+            'batches': len(batches),
+            'errors': errors,
+            'seconds': elapsed,
+            'events_per_sec': count / elapsed if elapsed else 0.0,
+            'forks': recorder.forks,
+            'restarts': recorder.restarts,
+            'writes': len(recorder.writes),
+            'signals': len(recorder.signals),
+            'forks_per_event': recorder.forks / count if count else 0.0,
+            'restarts_per_event': recorder.restarts / count if count else 0.0,
+            'writes_per_event': len(recorder.writes) / count if count else 0.0
+        }
+        report['tables'] = {table: hostcfgd.handler_stats.format(table) for table in sorted(hostcfgd.handler_stats.stats)}
+    return report
+
+
+def print_report(report):
+    load = report['load']
+    print('load: {:.1f} ms, {} forks, {} restarts, {} file writes, {} signals'.format(
+        load['seconds'] * 1000, load['forks'], load['restarts'], load['writes'], load['signals']))
+    ev = report['events']
+    print('events: {} in {} batches, {} errors, {:.1f} ms, {:.1f} events/sec'.format(
+        ev['count'], ev['batches'], ev['errors'], ev['seconds'] * 1000, ev['events_per_sec']))
+    print('per event: {:.2f} forks, {:.2f} restarts, {:.2f} file writes'.format(
+        ev['forks_per_event'], ev['restarts_per_event'], ev['writes_per_event']))
+    print('{:<24} {:>6} {:>6} {:>12} {:>12} {:>12}'.format(
+        'table', 'calls', 'keys', 'total ms', 'max ms', 'subproc ms'))
+    for table, stats in report['tables'].items():
+        print('{:<24} {:>6} {:>6} {:>12} {:>12} {:>12}'.format(
+            table, stats['calls'], stats['keys'], stats['total_latency_ms'],
+            stats['max_latency_ms'], stats['subprocess_ms']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='hostcfgd config change replay harness')
+    parser.add_argument('--config', help='config_db.json snapshot (default: hostcfgd test vectors)')
+    parser.add_argument('--events', help='json list of [table, key, data] events (default: synthetic)')
+    parser.add_argument('--rounds', type=int, default=1, help='rounds of synthetic events')
+    parser.add_argument('--batch', action='store_true', help='deliver consecutive events of a table at once')
+    parser.add_argument('--json', action='store_true', help='print the report as json')
+    parser.add_argument('--max-forks-per-event', type=float, help='fail if more forks per event')
+    parser.add_argument('--max-writes-per-event', type=float, help='fail if more file writes per event')
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config) as f:
+            config_db = json.load(f)
+    else:
+        from tests.hostcfgd.test_vectors import HOSTCFG_DAEMON_CFG_DB
+        config_db = HOSTCFG_DAEMON_CFG_DB
+
+    events = None
+    if args.events:
+        with open(args.events) as f:
+            events = [tuple(event) for event in json.load(f)]
+
+    report = replay(config_db, events, args.rounds, args.batch)
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
+
+    ev = report['events']
+    failed = ev['errors'] > 0
+    if args.max_forks_per_event is not None and ev['forks_per_event'] > args.max_forks_per_event:
+        print('forks per event {:.2f} above {}'.format(ev['forks_per_event'], args.max_forks_per_event), file=sys.stderr)
+        failed = True
+    if args.max_writes_per_event is not None and ev['writes_per_event'] > args.max_writes_per_event:
+        print('file writes per event {:.2f} above {}'.format(ev['writes_per_event'], args.max_writes_per_event), file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
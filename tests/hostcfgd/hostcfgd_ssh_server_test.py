@@ -1,3 +1,4 @@
+import copy
 import importlib.machinery
 import importlib.util
 import filecmp
@@ -240,3 +241,48 @@ class TestHostcfgdSSHServer(TestCase):
         """
 
         self.check_config(test_name, test_data, "modify_all")
+
+    def test_hostcfgd_sshs_restart_on_change_only(self):
+        """
+            Test the sshd config file is written and sshd restarted only when the
+            policies change the effective configuration
+        """
+        test_name = "SSH_SERVER"
+        op_path = output_path + "/" + test_name + "_restart_on_change_only"
+        hostcfgd.SSH_CONFG = op_path + "/sshd_config"
+        hostcfgd.SSH_CONFG_TMP = hostcfgd.SSH_CONFG + ".tmp"
+        shutil.rmtree(op_path, ignore_errors=True)
+        os.mkdir(op_path)
+        shutil.copyfile(sample_output_path + "/" + test_name + "/sshd_config.old", hostcfgd.SSH_CONFG)
+        os.chmod(hostcfgd.SSH_CONFG, 0o600)
+        ssh_table = {'POLICIES': {'authentication_retries': '4', 'login_timeout': '60',
+                                  'ports': '22,2222', 'inactivity_timeout': '10'}}
+
+        with mock.patch.object(hostcfgd, 'subprocess') as mocked_subprocess:
+            mocked_subprocess.run.return_value = subprocess.CompletedProcess([], 0)
+            hostcfgd.SshServer().load(copy.deepcopy(ssh_table))
+            mocked_subprocess.run.assert_called_once()
+            mocked_subprocess.check_call.assert_called_once_with(['systemctl', 'restart', 'ssh'])
+            # The rewritten config keeps its permissions
+            self.assertEqual(os.stat(hostcfgd.SSH_CONFG).st_mode & 0o777, 0o600)
+
+            # same policies - nothing to write and no restart
+            mocked_subprocess.reset_mock()
+            hostcfgd.SshServer().load(copy.deepcopy(ssh_table))
+            mocked_subprocess.run.assert_not_called()
+            mocked_subprocess.check_call.assert_not_called()
+
+    def test_sshd_config_model(self):
+        sshd_config = hostcfgd.SshdConfig(['#Port 22', 'Include /etc/ssh/sshd_config.d/*.conf',
+                                           '#LoginGraceTime 2m', 'PermitRootLogin yes'])
+        self.assertEqual(sshd_config.find("Port", True), 1)
+        self.assertEqual(sshd_config.find("MaxAuthTries"), 3)
+
+        sshd_config.set('LoginGraceTime', 120)
+        sshd_config.set('MaxAuthTries', 6)
+        sshd_config.remove(r"(#)?Port [0-9]+$")
+        sshd_config.insert(1, 'Port 22')
+        sshd_config.insert(1, 'Port 23')
+        self.assertEqual(sshd_config.lines, ['Port 23', 'Port 22', 'Include /etc/ssh/sshd_config.d/*.conf',
+                                             'LoginGraceTime 120', 'PermitRootLogin yes', 'MaxAuthTries 6'])
+        self.assertEqual(sshd_config.directives()[:2], [('port', '23'), ('port', '22')])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+    hostcfgd startup benchmark
+
+    Measures the time from the hostcfgd exec to the first processed CONFIG_DB
+    event. Every run is a fresh python process, so module imports and the Cfg
+    subsystems construction are measured cold. CONFIG_DB is served by
+    MockConfigDb, subprocess calls are stubbed and the generated files are
+    written into a temporary directory.
+
+    Usage (from the repository root):
+        python3 -m tests.hostcfgd.hostcfgd_startup_bench [--runs N] [--table TABLE --key KEY]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+test_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+modules_path = os.path.dirname(test_path)
+
+PHASES = ['import', 'init', 'load', 'first_event']
+
+
+def run_child(t_exec, table, key):
+    """ Start hostcfgd in this process and print the phases timestamps as json """
+    t_start = time.time()
+    sys.path.insert(0, modules_path)
+    from unittest import mock
+    from tests.common.mock_configdb import MockConfigDb, MockSelect
+    from tests.hostcfgd.hostcfgd_replay import load_hostcfgd, sandbox_hostcfgd
+    from tests.hostcfgd.test_vectors import HOSTCFG_DAEMON_CFG_DB
+
+    hostcfgd = load_hostcfgd()
+    t_import = time.time()
+
+    timestamps = {}
+    with tempfile.TemporaryDirectory() as work_dir, \
+            mock.patch('hostcfgd.subprocess'), mock.patch('hostcfgd.check_output_pipe'), \
+            mock.patch('hostcfgd.HostConfigDaemon.wait_till_system_init_done'):
+        sandbox_hostcfgd(hostcfgd, work_dir)
+        MockConfigDb.set_config_db(json.loads(json.dumps(HOSTCFG_DAEMON_CFG_DB)))
+        MockSelect.set_event_queue([(table, key)])
+
+        daemon = hostcfgd.HostConfigDaemon()
+        daemon.register_callbacks()
+        t_init = time.time()
+
+        daemon.load_initial_config()
+        t_load = time.time()
+
+        def first_event_handler(*args):
+            timestamps.setdefault('first_event', time.time())
+        daemon.callbacks[table].append(first_event_handler)
+        try:
+            daemon.start()
+        except TimeoutError:
+            # MockSelect raises it once the event queue is empty
+            pass
+
+    print(json.dumps({
+        'python': t_start - t_exec,
+        'import': t_import - t_exec,
+        'init': t_init - t_exec,
+        'load': t_load - t_exec,
+        'first_event': timestamps['first_event'] - t_exec
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='hostcfgd startup benchmark')
+    parser.add_argument('--runs', type=int, default=10, help='number of runs')
+    parser.add_argument('--table', default='NTP', help='table of the first event')
+    parser.add_argument('--key', default='global', help='key of the first event')
+    parser.add_argument('--child', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, args.table, args.key)
+        return
+
+    results = []
+    for _ in range(args.runs):
+        cmd = [sys.executable, '-m', 'tests.hostcfgd.hostcfgd_startup_bench',
+               '--table', args.table, '--key', args.key, '--child', repr(time.time())]
+        output = subprocess.check_output(cmd, cwd=modules_path, universal_newlines=True)
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print('hostcfgd startup, {} runs, first event {}|{} (ms since exec)'.format(args.runs, args.table, args.key))
+    print('{:<12} {:>10} {:>10} {:>10}'.format('phase', 'min', 'median', 'max'))
+    for phase in ['python'] + PHASES:
+        values = [r[phase] * 1000 for r in results]
+        print('{:<12} {:>10.1f} {:>10.1f} {:>10.1f}'.format(phase, min(values), statistics.median(values), max(values)))
+
+
+if __name__ == '__main__':
+    main()
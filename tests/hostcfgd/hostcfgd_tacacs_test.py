@@ -10,7 +10,7 @@ from parameterized import parameterized
 from unittest import TestCase, mock
 from sonic_py_common.general import getstatusoutput_noshell
 from tests.hostcfgd.test_tacacs_vectors import HOSTCFGD_TEST_TACACS_VECTOR
-from tests.common.mock_configdb import MockConfigDb, MockDBConnector
+from tests.common.mock_configdb import MockConfigDb, MockDBConnector, MockSubscriberStateTable, MockSelect
 
 test_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 modules_path = os.path.dirname(test_path)
@@ -32,6 +32,8 @@ sys.modules['hostcfgd'] = hostcfgd
 hostcfgd.ConfigDBConnector = MockConfigDb
 hostcfgd.DBConnector = MockDBConnector
 hostcfgd.Table = mock.Mock()
+swsscommon.Select = MockSelect
+swsscommon.SubscriberStateTable = MockSubscriberStateTable
 
 class TestHostcfgdTACACS(TestCase):
     """
@@ -221,7 +223,7 @@ class TestHostcfgdTACACS(TestCase):
 
             # simulate subscribe callback
             try:
-                host_config_daemon.__dict__['config_db'].publish('AAA', 'authorization', 'DEL', None)
+                host_config_daemon.handle_events('AAA', [('authorization', 'DEL', {})])
             except TypeError as e:
                 assert False
 
@@ -232,7 +234,7 @@ class TestHostcfgdTACACS(TestCase):
                 mock.call(mocked_syslog.LOG_INFO, "Found audisp-tacplus PID: "),
                 mock.call(mocked_syslog.LOG_INFO, "cmd - ['service', 'aaastatsd', 'stop']"),
                 mock.call(mocked_syslog.LOG_ERR, "['service', 'aaastatsd', 'stop'] - failed: return code - 1, output:\nNone"),
-                mock.call(mocked_syslog.LOG_INFO, "AAA Update: key: DEL, op: DEL, data: {}")
+                mock.call(mocked_syslog.LOG_INFO, "AAA Update: key: authorization, op: DEL, data: {}")
             ]
             for expected_call in expected:
                 assert expected_call in mocked_syslog.mock_calls, f"Expected call {expected_call} not found"
@@ -1,8 +1,16 @@
+import copy
+import errno
+import json
 import os
 import sys
 import time
 import signal
 import psutil
+import pytest
+import subprocess
+import tempfile
+import textwrap
+import threading
 import swsscommon as swsscommon_package
 from subprocess import CalledProcessError
 from sonic_py_common import device_info
@@ -12,7 +20,7 @@ from sonic_py_common.general import load_module_from_source
 from unittest import TestCase, mock
 
 from .test_vectors import HOSTCFG_DAEMON_INIT_CFG_DB, HOSTCFG_DAEMON_CFG_DB
-from tests.common.mock_configdb import MockConfigDb, MockDBConnector
+from tests.common.mock_configdb import MockConfigDb, MockDBConnector, MockSubscriberStateTable, MockSelect
 from pyfakefs.fake_filesystem_unittest import patchfs
 from deepdiff import DeepDiff
 from unittest.mock import call
@@ -28,6 +36,14 @@ hostcfgd = load_module_from_source('hostcfgd', hostcfgd_path)
 hostcfgd.ConfigDBConnector = MockConfigDb
 hostcfgd.DBConnector = MockDBConnector
 hostcfgd.Table = mock.Mock()
+swsscommon.Select = MockSelect
+swsscommon.SubscriberStateTable = MockSubscriberStateTable
+
+
+def skip_initial_replay(daemon):
+    """ Drop the keys the subscribers replay on construction, load_initial_config() consumes them """
+    for subscriber, _ in daemon.subscriber_map.values():
+        subscriber.pops()
 
 
 class TesNtpCfgd(TestCase):
@@ -61,8 +77,11 @@ class TesNtpCfgd(TestCase):
             mocked_subprocess.check_call.reset_mock()
             ntpcfgd.ntp_srv_key_update({}, MockConfigDb.CONFIG_DB['NTP_KEY'])
             mocked_subprocess.check_call.assert_has_calls([
-                call(['systemctl', 'restart', 'chrony'])
+                call(['sonic-cfggen', '-d', '-t',
+                      '/usr/share/sonic/templates/chrony.keys.j2,/etc/chrony/chrony.keys']),
+                call(['chronyc', 'rekey'])
             ])
+            assert call(['systemctl', 'restart', 'chrony']) not in mocked_subprocess.check_call.call_args_list
 
     def test_ntp_global_update_ntp_servers(self):
         with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
@@ -81,8 +100,9 @@ class TesNtpCfgd(TestCase):
             mocked_subprocess.check_call.reset_mock()
             ntpcfgd.ntp_srv_key_update({'0.debian.pool.ntp.org': {}}, {})
             mocked_subprocess.check_call.assert_has_calls([
-                call(['systemctl', 'restart', 'chrony'])
+                call(['chronyc', 'add', 'server', '0.debian.pool.ntp.org'])
             ])
+            assert call(['systemctl', 'restart', 'chrony']) not in mocked_subprocess.check_call.call_args_list
 
     def test_ntp_is_caching_config(self):
         with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
@@ -114,11 +134,81 @@ class TesNtpCfgd(TestCase):
             ntpcfgd.cache['global'] = MockConfigDb.CONFIG_DB['NTP']['global']
             ntpcfgd.cache['servers'] = {'0.debian.pool.ntp.org': {}}
 
+            # Applied only once debounced
             ntpcfgd.handle_ntp_source_intf_chg('eth0')
+            ntpcfgd.apply_source_intf_chg()
+            mocked_subprocess.check_call.assert_not_called()
+
+            ntpcfgd.apply_source_intf_chg(force=True)
             mocked_subprocess.check_call.assert_has_calls([
                 call(['systemctl', 'restart', 'chrony'])
             ])
 
+    def test_loopback_flap(self):
+        with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
+            ntpcfgd = hostcfgd.NtpCfg()
+            ntpcfgd.load({'global': {'vrf': 'default', 'src_intf': 'Loopback0'}},
+                         {'10.0.0.1': {}}, {},
+                         {('Loopback0', '10.1.0.32/32'): {}})
+
+            # The address is removed and added back within the debounce interval
+            ntpcfgd.handle_ntp_source_intf_chg('Loopback0', '10.1.0.32/32', False)
+            ntpcfgd.handle_ntp_source_intf_chg('Loopback0', '10.1.0.32/32', True)
+            ntpcfgd.apply_source_intf_chg(force=True)
+            mocked_subprocess.check_call.assert_not_called()
+
+            # The address is changed
+            ntpcfgd.handle_ntp_source_intf_chg('Loopback0', '10.1.0.32/32', False)
+            ntpcfgd.handle_ntp_source_intf_chg('Loopback0', '10.1.0.33/32', True)
+            ntpcfgd.apply_source_intf_chg(force=True)
+            mocked_subprocess.check_call.assert_called_once_with(
+                ['systemctl', 'restart', 'chrony'])
+
+    def test_ntp_servers_runtime_update(self):
+        with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
+            ntpcfgd = hostcfgd.NtpCfg()
+            ntpcfgd.load({'global': {'vrf': 'default'}},
+                         {'10.0.0.1': {'iburst': 'on'},
+                          '10.0.0.2': {},
+                          'pool.ntp.org': {'association_type': 'pool'}}, {})
+
+            ntpcfgd.ntp_srv_key_update({'10.0.0.1': {'iburst': 'on'},
+                                        '10.0.0.2': {'key': '42', 'version': '4'},
+                                        '10.0.0.3': {'admin_state': 'disabled'},
+                                        'pool.ntp.org': {'association_type': 'pool'}},
+                                       {})
+            assert mocked_subprocess.check_call.call_args_list == [
+                call(['chronyc', 'delete', '10.0.0.2']),
+                call(['chronyc', 'add', 'server', '10.0.0.2', 'key', '42', 'version', '4'])
+            ]
+
+            # A pool cannot be deleted at runtime
+            mocked_subprocess.check_call.reset_mock()
+            ntpcfgd.ntp_srv_key_update({'10.0.0.1': {'iburst': 'on'}}, {})
+            assert mocked_subprocess.check_call.call_args_list == [
+                call(['systemctl', 'restart', 'chrony'])
+            ]
+
+            # chronyc failure falls back to the restart
+            mocked_subprocess.check_call.reset_mock()
+            mocked_subprocess.check_call.side_effect = [CalledProcessError(1, 'chronyc'), None]
+            ntpcfgd.ntp_srv_key_update({'10.0.0.1': {'iburst': 'on'}, '10.0.0.4': {}}, {})
+            assert mocked_subprocess.check_call.call_args_list == [
+                call(['chronyc', 'add', 'server', '10.0.0.4']),
+                call(['systemctl', 'restart', 'chrony'])
+            ]
+            assert '10.0.0.4' in ntpcfgd.cache['servers']
+
+            # A field not mapped to the chronyc options falls back to the restart
+            mocked_subprocess.check_call.reset_mock()
+            mocked_subprocess.check_call.side_effect = None
+            ntpcfgd.ntp_srv_key_update({'10.0.0.1': {'iburst': 'on', 'minpoll': '4'},
+                                        '10.0.0.4': {}}, {})
+            assert mocked_subprocess.check_call.call_args_list == [
+                call(['systemctl', 'restart', 'chrony'])
+            ]
+            assert ntpcfgd.cache['servers']['10.0.0.1'] == {'iburst': 'on', 'minpoll': '4'}
+
 
 class TestSerialConsoleCfgd(TestCase):
     """
@@ -173,13 +263,14 @@ class TestHostcfgdDaemon(TestCase):
 
     def tearDown(self):
         MockConfigDb.CONFIG_DB = {}
+        MockSelect.reset_event_queue()
         self.get_dev_meta.stop()
 
     def test_loopback_events(self):
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
-        MockConfigDb.event_queue = [('NTP', 'global'),
+        MockSelect.set_event_queue([('NTP', 'global'),
                                   ('NTP_SERVER', '0.debian.pool.ntp.org'),
-                                  ('LOOPBACK_INTERFACE', 'Loopback0|10.184.8.233/32')]
+                                  ('LOOPBACK_INTERFACE', 'Loopback0|10.184.8.233/32')])
         daemon = hostcfgd.HostConfigDaemon()
         daemon.register_callbacks()
         with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
@@ -200,7 +291,7 @@ class TestHostcfgdDaemon(TestCase):
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
         daemon = hostcfgd.HostConfigDaemon()
         daemon.register_callbacks()
-        MockConfigDb.event_queue = [('KDUMP', 'config')]
+        MockSelect.set_event_queue([('KDUMP', 'config')])
         with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
             popen_mock = mock.Mock()
             attrs = {'communicate.return_value': ('output', 'error')}
@@ -249,7 +340,7 @@ class TestHostcfgdDaemon(TestCase):
         default=daemon.kdumpCfg.kdump_defaults
         daemon.kdumpCfg.load(default)
         daemon.register_callbacks()
-        MockConfigDb.event_queue = [('KDUMP', 'config')]
+        MockSelect.set_event_queue([('KDUMP', 'config')])
         with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
             popen_mock = mock.Mock()
             attrs = {'communicate.return_value': ('output', 'error')}
@@ -278,8 +369,8 @@ class TestHostcfgdDaemon(TestCase):
         1) syslog_with_osversion flag change
         """
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
-        MockConfigDb.event_queue = [(swsscommon.CFG_DEVICE_METADATA_TABLE_NAME,
-                                    'localhost')]
+        MockSelect.set_event_queue([(swsscommon.CFG_DEVICE_METADATA_TABLE_NAME,
+                                    'localhost')])
         daemon = hostcfgd.HostConfigDaemon()
         daemon.aaacfg = mock.MagicMock()
         daemon.iptables = mock.MagicMock()
@@ -306,6 +397,7 @@ class TestHostcfgdDaemon(TestCase):
         HOSTCFG_DAEMON_CFG_DB["DEVICE_METADATA"]["localhost"]["hostname"] = ""
         original_syslog = hostcfgd.syslog
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
+        MockSelect.set_event_queue([(swsscommon.CFG_DEVICE_METADATA_TABLE_NAME, 'localhost')])
         with mock.patch('hostcfgd.syslog') as mocked_syslog:
             with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
                 mocked_syslog.LOG_ERR = original_syslog.LOG_ERR
@@ -322,6 +414,7 @@ class TestHostcfgdDaemon(TestCase):
         daemon.devmetacfg.hostname = "SameHostName"
         HOSTCFG_DAEMON_CFG_DB["DEVICE_METADATA"]["localhost"]["hostname"] = daemon.devmetacfg.hostname
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
+        MockSelect.set_event_queue([(swsscommon.CFG_DEVICE_METADATA_TABLE_NAME, 'localhost')])
         with mock.patch('hostcfgd.syslog') as mocked_syslog:
             with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
                 mocked_syslog.LOG_INFO = original_syslog.LOG_INFO
@@ -338,6 +431,7 @@ class TestHostcfgdDaemon(TestCase):
         daemon.devmetacfg.syslog_with_osversion = "false"
         HOSTCFG_DAEMON_CFG_DB["DEVICE_METADATA"]["localhost"]["syslog_with_osversion"] = 'true'
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
+        MockSelect.set_event_queue([(swsscommon.CFG_DEVICE_METADATA_TABLE_NAME, 'localhost')])
         with mock.patch('hostcfgd.syslog') as mocked_syslog:
             with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
                 mocked_syslog.LOG_INFO = original_syslog.LOG_INFO
@@ -358,10 +452,10 @@ class TestHostcfgdDaemon(TestCase):
         2) Management vrf setup
         """
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
-        MockConfigDb.event_queue = [
+        MockSelect.set_event_queue([
             (swsscommon.CFG_MGMT_INTERFACE_TABLE_NAME, 'eth0|1.2.3.4/24'),
             (swsscommon.CFG_MGMT_VRF_CONFIG_TABLE_NAME, 'vrf_global')
-        ]
+        ])
         daemon = hostcfgd.HostConfigDaemon()
         daemon.register_callbacks()
         daemon.aaacfg = mock.MagicMock()
@@ -417,11 +511,117 @@ class TestHostcfgdDaemon(TestCase):
                 mgmtiface.update_mgmt_vrf({'mgmtVrfEnabled' : "false"})
                 assert mgmtiface.mgmt_vrf_enabled == "false"
 
+    def test_server_events_batched(self):
+        """
+        Test the keys popped at once are delivered to the batch handlers in one call:
+        the AAA config files are rendered and the NTP servers are applied once per batch.
+        """
+        cfg_db = copy.deepcopy(HOSTCFG_DAEMON_CFG_DB)
+        cfg_db['TACPLUS_SERVER'] = {'10.0.0.1': {'priority': '1'}, '10.0.0.2': {'priority': '2'}}
+        MockConfigDb.set_config_db(cfg_db)
+        MockSelect.set_event_queue([('TACPLUS_SERVER', '10.0.0.1'),
+                                    ('NTP_SERVER', '0.debian.pool.ntp.org'),
+                                    ('TACPLUS_SERVER', '10.0.0.2'),
+                                    ('TACPLUS_SERVER', '10.0.0.3')])
+        daemon = hostcfgd.HostConfigDaemon()
+        daemon.aaacfg = mock.MagicMock()
+        daemon.ntpcfg = mock.MagicMock()
+        daemon.register_callbacks()
+        skip_initial_replay(daemon)
+        try:
+            daemon.start()
+        except TimeoutError:
+            pass
+
+        daemon.aaacfg.tacacs_server_update.assert_has_calls([
+            call('10.0.0.1', {'priority': '1'}, modify_conf=False),
+            call('10.0.0.2', {'priority': '2'}, modify_conf=False),
+            call('10.0.0.3', {}, modify_conf=False)])
+        daemon.aaacfg.modify_conf_file.assert_called_once()
+        daemon.ntpcfg.ntp_srv_key_update.assert_called_once()
+
+    def test_initial_config_applied_once(self):
+        """
+        Test the keys the subscribers replay on construction are the initial config:
+        each subsystem loads them once and no handler runs them again afterwards.
+        """
+        MockConfigDb.set_config_db(copy.deepcopy(HOSTCFG_DAEMON_CFG_DB))
+        MockSelect.set_event_queue([])
+        daemon = hostcfgd.HostConfigDaemon()
+        for name in ['kdumpCfg', 'aaacfg', 'ntpcfg', 'iptables', 'passwcfg', 'dnscfg', 'sshscfg',
+                     'memorystatisticscfg', 'devmetacfg', 'mgmtifacecfg', 'pamLimitsCfg']:
+            setattr(daemon, name, mock.MagicMock())
+        daemon.register_callbacks()
+        with mock.patch.object(daemon, 'wait_till_system_init_done'), \
+                mock.patch.object(daemon, 'handle_events') as mock_handle_events:
+            daemon.load_initial_config()
+            try:
+                daemon.start()
+            except TimeoutError:
+                pass
+            mock_handle_events.assert_not_called()
+
+        daemon.kdumpCfg.load.assert_called_once_with(HOSTCFG_DAEMON_CFG_DB['KDUMP'])
+        daemon.ntpcfg.load.assert_called_once_with(
+            HOSTCFG_DAEMON_CFG_DB['NTP'], HOSTCFG_DAEMON_CFG_DB['NTP_SERVER'], HOSTCFG_DAEMON_CFG_DB['NTP_KEY'],
+            {hostcfgd.ConfigDBConnector.deserialize_key(key): data
+             for key, data in HOSTCFG_DAEMON_CFG_DB['LOOPBACK_INTERFACE'].items()})
+        daemon.aaacfg.load.assert_called_once()
+        daemon.kdumpCfg.kdump_update.assert_not_called()
+        daemon.aaacfg.aaa_update.assert_not_called()
+
+    def test_unconfigured_subsystems(self):
+        """
+        Test the subsystems without configuration at startup: AAA still gets the
+        hostname, and NtpCfg built on a later event knows the loopback addresses.
+        """
+        cfg_db = copy.deepcopy(HOSTCFG_DAEMON_CFG_DB)
+        cfg_db['NTP'] = {}
+        cfg_db['NTP_SERVER'] = {}
+        MockConfigDb.set_config_db(cfg_db)
+        init_data = copy.deepcopy(HOSTCFG_DAEMON_INIT_CFG_DB)
+        init_data['DEVICE_METADATA'] = {}
+        init_data['BANNER_MESSAGE'] = {}
+        daemon = hostcfgd.HostConfigDaemon()
+        for name in ['aaacfg', 'kdumpCfg', 'passwcfg', 'dnscfg', 'memorystatisticscfg', 'sshscfg', 'pamLimitsCfg']:
+            setattr(daemon, name, mock.MagicMock())
+        with mock.patch.object(daemon, 'wait_till_system_init_done'), \
+                mock.patch.object(hostcfgd.BannerCfg, 'banner_message') as mock_banner_message:
+            daemon.load(init_data)
+        daemon.aaacfg.hostname_update.assert_called_once_with('')
+        assert 'ntpcfg' not in daemon.__dict__
+        # BannerCfg is force loaded at boot even without BANNER_MESSAGE
+        mock_banner_message.assert_has_calls([call('state', {}), call('login', {}),
+                                              call('motd', {}), call('logout', {})])
+
+        assert daemon.ntpcfg.intf_addrs == {'Loopback0': {'10.184.8.233/32'}}
+        assert daemon.ntpcfg.cache == {'global': {}, 'servers': {}, 'keys': {}}
+
+    def test_ntp_loaded_once(self):
+        """
+        Test NtpCfg is loaded once at startup when the NTP tables have content,
+        without reading LOOPBACK_INTERFACE again.
+        """
+        MockConfigDb.set_config_db(copy.deepcopy(HOSTCFG_DAEMON_CFG_DB))
+        init_data = copy.deepcopy(HOSTCFG_DAEMON_INIT_CFG_DB)
+        init_data['NTP_SERVER'] = {'10.0.0.1': {}}
+        daemon = hostcfgd.HostConfigDaemon()
+        for name in ['aaacfg', 'kdumpCfg', 'passwcfg', 'dnscfg', 'memorystatisticscfg', 'sshscfg', 'pamLimitsCfg']:
+            setattr(daemon, name, mock.MagicMock())
+        with mock.patch.object(daemon, 'wait_till_system_init_done'), \
+                mock.patch.object(hostcfgd.NtpCfg, 'load') as mock_ntp_load, \
+                mock.patch.object(daemon.config_db, 'get_table', wraps=daemon.config_db.get_table) as mock_get_table, \
+                mock.patch('hostcfgd.run_cmd'):
+            daemon.load(init_data)
+        mock_ntp_load.assert_called_once()
+        assert call('LOOPBACK_INTERFACE') not in mock_get_table.call_args_list
+
     def test_dns_events(self):
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
-        MockConfigDb.event_queue = [('DNS_NAMESERVER', '1.1.1.1')]
+        MockSelect.set_event_queue([('DNS_NAMESERVER', '1.1.1.1')])
         daemon = hostcfgd.HostConfigDaemon()
         daemon.register_callbacks()
+        skip_initial_replay(daemon)
         with mock.patch('hostcfgd.run_cmd') as mocked_run_cmd:
             try:
                 daemon.start()
@@ -431,9 +631,10 @@ class TestHostcfgdDaemon(TestCase):
 
     def test_dns_options_events(self):
         MockConfigDb.set_config_db(HOSTCFG_DAEMON_CFG_DB)
-        MockConfigDb.event_queue = [('DNS_OPTIONS', 'ndots')]
+        MockSelect.set_event_queue([('DNS_OPTIONS', 'ndots')])
         daemon = hostcfgd.HostConfigDaemon()
         daemon.register_callbacks()
+        skip_initial_replay(daemon)
         with mock.patch('hostcfgd.run_cmd') as mocked_run_cmd:
             try:
                 daemon.start()
@@ -477,6 +678,143 @@ class TestBannerCfg:
         mock_run_cmd.assert_has_calls([call(['systemctl', 'restart', 'banner-config'], True, True)])
 
 
+class TestHandlerStats(TestCase):
+    """
+        Test hostcfgd per table handler statistics
+    """
+    def setUp(self):
+        MockConfigDb.set_config_db(copy.deepcopy(HOSTCFG_DAEMON_CFG_DB))
+        self.stats = hostcfgd.HandlerStats()
+        self.patcher = mock.patch('hostcfgd.handler_stats', self.stats)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        MockConfigDb.CONFIG_DB = {}
+
+    def test_handler_stats(self):
+        daemon = hostcfgd.HostConfigDaemon()
+        daemon.dnscfg = hostcfgd.DnsCfg()
+        daemon.register_callbacks()
+        with mock.patch('hostcfgd.subprocess') as mocked_subprocess:
+            daemon.handle_events('DNS_NAMESERVER', [('1.1.1.1', 'SET', {}), ('8.8.8.8', 'SET', {})])
+            daemon.handle_events('DNS_NAMESERVER', [('8.8.8.8', 'DEL', {})])
+            self.assertEqual(mocked_subprocess.check_call.call_count, 3)
+
+        stats = self.stats.stats['DNS_NAMESERVER']
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['keys'], 3)
+        self.assertEqual(stats['max_batch'], 2)
+        self.assertGreater(stats['total_latency'], 0)
+        self.assertGreaterEqual(stats['total_latency'], stats['max_latency'])
+        self.assertGreater(stats['subprocess_time'], 0)
+        self.assertGreaterEqual(stats['total_latency'], stats['subprocess_time'])
+
+        # subprocesses run out of handlers are not accounted
+        with mock.patch('hostcfgd.subprocess'):
+            hostcfgd.run_cmd(['true'])
+        self.assertIsNone(self.stats.subprocess_time)
+
+    def test_handler_stats_publish(self):
+        stats_table = mock.Mock()
+        with self.stats.measure('NTP', 1):
+            pass
+        with self.stats.measure('AAA', 2):
+            pass
+
+        self.stats.publish(stats_table)
+        stats_table.set.assert_not_called()
+
+        self.stats.publish(stats_table, force=True)
+        self.assertEqual([c[0][0] for c in stats_table.set.call_args_list], ['AAA', 'NTP'])
+        fields = dict(stats_table.set.call_args_list[0][0][1])
+        self.assertEqual(fields['calls'], '1')
+        self.assertEqual(fields['keys'], '2')
+        self.assertEqual(set(fields), {'calls', 'keys', 'max_batch', 'total_latency_ms',
+                                       'max_latency_ms', 'subprocess_ms'})
+
+        # only the tables updated since the last snapshot are written
+        stats_table.reset_mock()
+        with self.stats.measure('NTP', 1):
+            pass
+        self.stats.publish(stats_table, force=True)
+        self.assertEqual([c[0][0] for c in stats_table.set.call_args_list], ['NTP'])
+
+    def test_handler_stats_sigusr1(self):
+        with self.stats.measure('KDUMP', 1):
+            pass
+        with mock.patch('hostcfgd.syslog.syslog') as mocked_syslog:
+            hostcfgd.signal_handler(signal.SIGUSR1, None)
+            mocked_syslog.assert_any_call(mock.ANY, 'HostCfgd: handler statistics of 1 tables')
+            self.assertTrue(any('HostCfgd: KDUMP: calls=1, keys=1' in c[0][1] for c in mocked_syslog.call_args_list))
+
+
+class TestReplayHarness(TestCase):
+    """
+        Smoke test of the config change replay harness, run in its own process
+        since it loads and sandboxes its own hostcfgd module
+    """
+    def test_replay(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            events_file = os.path.join(tmpdir, 'events.json')
+            with open(events_file, 'w') as f:
+                json.dump([['TACPLUS_SERVER', '10.0.0.1', {'priority': '1', 'tcp_port': '49'}],
+                           ['TACPLUS_SERVER', '10.0.0.2', {'priority': '2', 'tcp_port': '49'}],
+                           ['TACPLUS_SERVER', '10.0.0.1', None],
+                           ['DNS_NAMESERVER', '1.1.1.1', {}]], f)
+            output = subprocess.check_output([sys.executable, '-m', 'tests.hostcfgd.hostcfgd_replay',
+                                              '--events', events_file, '--batch', '--json'],
+                                             cwd=modules_path, universal_newlines=True)
+        report = json.loads(output)
+        self.assertEqual(report['events']['count'], 4)
+        self.assertEqual(report['events']['batches'], 2)
+        self.assertEqual(report['events']['errors'], 0)
+        self.assertEqual(report['tables']['TACPLUS_SERVER']['calls'], '1')
+        self.assertEqual(report['tables']['TACPLUS_SERVER']['keys'], '3')
+        self.assertGreater(report['events']['writes'], 0)
+        self.assertIn('forks_per_event', report['events'])
+        self.assertEqual(report['events']['signals'], 0)
+
+    def test_recorder(self):
+        """ The recorders share one audit hook, installed on the first start """
+        script = textwrap.dedent('''
+            import json, os, signal, sys, tempfile
+            from unittest import mock
+            from tests.hostcfgd import hostcfgd_replay
+
+            hooks = []
+            add_audit_hook = sys.addaudithook
+            with mock.patch('sys.addaudithook', side_effect=lambda hook: (hooks.append(hook), add_audit_hook(hook))):
+                first = hostcfgd_replay.Recorder()
+                second = hostcfgd_replay.Recorder()
+                installed = len(hooks)
+                tmpdir = tempfile.mkdtemp()
+                first.start()
+                first.stop()
+                second.start()
+                with open(os.path.join(tmpdir, 'file'), 'w'):
+                    pass
+                second.kill(1234, signal.SIGHUP)
+                second.stop()
+                with open(os.path.join(tmpdir, 'other'), 'w'):
+                    pass
+
+            hostcfgd = hostcfgd_replay.load_hostcfgd()
+            hostcfgd_replay.sandbox_hostcfgd(hostcfgd, tmpdir)
+            print(json.dumps({'installed': installed, 'hooks': len(hooks), 'tmpdir': tmpdir,
+                              'first': first.writes, 'second': second.writes, 'signals': second.signals,
+                              'pid_file': hostcfgd.MemoryStatisticsCfg.PID_FILE_PATH}))
+        ''')
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=modules_path, universal_newlines=True)
+        result = json.loads(output.strip().splitlines()[-1])
+        self.assertEqual(result['installed'], 0)
+        self.assertEqual(result['hooks'], 1)
+        self.assertEqual(result['first'], [])
+        self.assertEqual(result['second'], [os.path.join(result['tmpdir'], 'file')])
+        self.assertEqual(result['signals'], [[1234, int(signal.SIGHUP)]])
+        self.assertEqual(result['pid_file'], os.path.join(result['tmpdir'], 'memory_statistics_daemon.pid'))
+
+
 class TestMemoryStatisticsCfgd(TestCase):
     """Test suite for MemoryStatisticsCfg class which handles memory statistics configuration and daemon management."""
 
@@ -642,6 +980,7 @@ class TestMemoryStatisticsCfgd(TestCase):
         """
         with mock.patch.object(self.mem_stat_cfg, 'restart_memory_statistics') as mock_restart:
             self.mem_stat_cfg.memory_statistics_update('enabled', 'true')
+            self.mem_stat_cfg.wait_supervisor_idle()
             mock_restart.assert_called_once()
             self.assertEqual(self.mem_stat_cfg.cache['enabled'], 'true')
 
@@ -649,12 +988,14 @@ class TestMemoryStatisticsCfgd(TestCase):
         """Test apply_setting with sampling_interval or retention_period"""
         with mock.patch.object(self.mem_stat_cfg, 'reload_memory_statistics') as mock_reload:
             self.mem_stat_cfg.apply_setting('sampling_interval', '10')
+            self.mem_stat_cfg.wait_supervisor_idle()
             mock_reload.assert_called_once()
 
     def test_apply_setting_with_enabled_false(self):
         """Test apply_setting with enabled=false"""
         with mock.patch.object(self.mem_stat_cfg, 'shutdown_memory_statistics') as mock_shutdown:
             self.mem_stat_cfg.apply_setting('enabled', 'false')
+            self.mem_stat_cfg.wait_supervisor_idle()
             mock_shutdown.assert_called_once()
 
     def test_memory_statistics_disable(self):
@@ -677,6 +1018,7 @@ class TestMemoryStatisticsCfgd(TestCase):
              mock.patch.object(self.mem_stat_cfg, 'wait_for_shutdown') as mock_wait:
 
             self.mem_stat_cfg.memory_statistics_update('enabled', 'false')
+            self.mem_stat_cfg.wait_supervisor_idle()
 
             mock_get_pid.assert_called_once()
             mock_kill.assert_called_once_with(123, signal.SIGTERM)
@@ -690,6 +1032,7 @@ class TestMemoryStatisticsCfgd(TestCase):
 
         with mock.patch.object(self.mem_stat_cfg, 'get_memory_statistics_pid', return_value=None) as mock_get_pid:
             self.mem_stat_cfg.memory_statistics_update('enabled', 'false')
+            self.mem_stat_cfg.wait_supervisor_idle()
 
             mock_get_pid.assert_called_once()
 
@@ -748,7 +1091,8 @@ class TestMemoryStatisticsCfgd(TestCase):
         """
         mock_process = mock.Mock()
         mock_process.wait.side_effect = psutil.TimeoutExpired(123, 10)
-        with mock.patch('hostcfgd.psutil.Process', return_value=mock_process), \
+        with mock.patch('hostcfgd.os.pidfd_open', side_effect=OSError(errno.ENOSYS, 'pidfd not supported')), \
+             mock.patch('hostcfgd.psutil.Process', return_value=mock_process), \
              mock.patch('hostcfgd.syslog.syslog') as mock_syslog:
             self.mem_stat_cfg.wait_for_shutdown(123)
             mock_syslog.assert_any_call(mock.ANY, "MemoryStatisticsCfg: Timed out while waiting for daemon (PID 123) to shut down.")
@@ -758,7 +1102,8 @@ class TestMemoryStatisticsCfgd(TestCase):
         """Test shutdown waiting when process doesn't exist"""
         mock_process.side_effect = psutil.NoSuchProcess(123)
 
-        with mock.patch('hostcfgd.syslog.syslog') as mock_syslog:
+        with mock.patch('hostcfgd.os.pidfd_open', side_effect=OSError(errno.ENOSYS, 'pidfd not supported')), \
+             mock.patch('hostcfgd.syslog.syslog') as mock_syslog:
             self.mem_stat_cfg.wait_for_shutdown(123)
             mock_syslog.assert_any_call(mock.ANY, "MemoryStatisticsCfg: MemoryStatisticsDaemon process not found.")
 
@@ -776,7 +1121,8 @@ class TestMemoryStatisticsCfgd(TestCase):
     def test_wait_for_shutdown_success(self):
         """Test successful wait for shutdown"""
         mock_process = mock.Mock()
-        with mock.patch('hostcfgd.psutil.Process', return_value=mock_process) as mock_process_class, \
+        with mock.patch('hostcfgd.os.pidfd_open', side_effect=OSError(errno.ENOSYS, 'pidfd not supported')), \
+            mock.patch('hostcfgd.psutil.Process', return_value=mock_process) as mock_process_class, \
             mock.patch('hostcfgd.syslog.syslog') as mock_syslog:
 
             self.mem_stat_cfg.wait_for_shutdown(123)
@@ -785,6 +1131,56 @@ class TestMemoryStatisticsCfgd(TestCase):
             mock_process.wait.assert_called_once_with(timeout=10)
             mock_syslog.assert_any_call(mock.ANY, "MemoryStatisticsCfg: MemoryStatisticsDaemon stopped gracefully")
 
+    @pytest.mark.skipif(not hasattr(os, 'pidfd_open'), reason="pidfd is not supported")
+    def test_wait_for_exit_pidfd(self):
+        """Test waiting for the process exit on a pidfd"""
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            self.assertFalse(self.mem_stat_cfg.wait_for_exit(process.pid, 0.1))
+            process.terminate()
+            self.assertTrue(self.mem_stat_cfg.wait_for_exit(process.pid, 10))
+        finally:
+            process.kill()
+            process.wait()
+
+    def test_restart_memory_statistics_async(self):
+        """Test the daemon is restarted by the supervisor, without blocking the caller on its exit"""
+        exited = threading.Event()
+        with mock.patch.object(self.mem_stat_cfg, 'get_memory_statistics_pid', return_value=123), \
+             mock.patch('hostcfgd.os.kill'), \
+             mock.patch.object(self.mem_stat_cfg, 'wait_for_shutdown', side_effect=lambda pid: exited.wait(10)), \
+             mock.patch('hostcfgd.subprocess.Popen') as mock_popen:
+            self.mem_stat_cfg.memory_statistics_update('enabled', 'true')
+            mock_popen.assert_not_called()
+            self.assertEqual(self.mem_stat_cfg.cache['enabled'], 'true')
+
+            exited.set()
+            self.mem_stat_cfg.wait_supervisor_idle()
+            mock_popen.assert_called_once_with([self.mem_stat_cfg.DAEMON_EXEC_PATH])
+
+    def test_get_memory_statistics_pid_cached(self):
+        """Test the PID file is parsed again only after it was modified"""
+        mock_process = mock.Mock(pid=123)
+        mock_process.name.return_value = "memory_statistics_service.py"
+        mock_process.is_running.return_value = True
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.mem_stat_cfg.PID_FILE_PATH = os.path.join(tmpdir, 'memory_statistics_daemon.pid')
+            with open(self.mem_stat_cfg.PID_FILE_PATH, 'w') as pid_file:
+                pid_file.write('123')
+
+            with mock.patch('hostcfgd.psutil.pid_exists', return_value=True), \
+                 mock.patch('hostcfgd.psutil.Process', return_value=mock_process) as mock_process_class:
+                self.assertEqual(self.mem_stat_cfg.get_memory_statistics_pid(), 123)
+                self.assertEqual(self.mem_stat_cfg.get_memory_statistics_pid(), 123)
+                mock_process_class.assert_called_once_with(123)
+
+                with open(self.mem_stat_cfg.PID_FILE_PATH, 'w') as pid_file:
+                    pid_file.write('4567')
+                mock_process.pid = 4567
+                self.assertEqual(self.mem_stat_cfg.get_memory_statistics_pid(), 4567)
+                mock_process_class.assert_called_with(4567)
+
     # Group 8: Error Handling Tests
     def test_memory_statistics_update_exception_handling(self):
         """
@@ -802,6 +1198,7 @@ class TestMemoryStatisticsCfgd(TestCase):
                              side_effect=Exception("Test error")):
             with mock.patch('hostcfgd.syslog.syslog') as mock_syslog:
                 self.mem_stat_cfg.apply_setting('enabled', 'true')
+                self.mem_stat_cfg.wait_supervisor_idle()
                 mock_syslog.assert_any_call(mock.ANY,
                     "MemoryStatisticsCfg: Exception in apply_setting() for key 'enabled': Test error")
 
@@ -833,7 +1230,8 @@ class TestMemoryStatisticsCfgd(TestCase):
     def test_wait_for_shutdown_general_exception(self, mock_process):
         """Test general exception handling in wait_for_shutdown"""
         mock_process.side_effect = Exception("Unexpected shutdown error")
-        with mock.patch('hostcfgd.syslog.syslog') as mock_syslog:
+        with mock.patch('hostcfgd.os.pidfd_open', side_effect=OSError(errno.ENOSYS, 'pidfd not supported')), \
+             mock.patch('hostcfgd.syslog.syslog') as mock_syslog:
             self.mem_stat_cfg.wait_for_shutdown(123)
             mock_syslog.assert_any_call(mock.ANY,
                 "MemoryStatisticsCfg: Exception in wait_for_shutdown(): Unexpected shutdown error")
@@ -100,6 +100,8 @@ HOSTCFG_DAEMON_CFG_DB = {
         "1.1.1.1": {}
     },
     "DNS_OPTIONS": {
-        "ndots": "4"
+        "ndots": {
+            "ndots": "4"
+        }
     }
 }
@@ -43,3 +43,50 @@ class MockConnector(object):
             self.delete(db_id, key)
 
 
+
+
+class MockRedisPipeline(object):
+    """ swsscommon.RedisPipeline, counting the commands it holds """
+
+    def __init__(self, db, sz=128):
+        self.size = sz
+        self.pending = 0
+
+
+class MockTable(object):
+    """
+    swsscommon.Table on a pipeline, writing into MockConnector.data. The
+    flushes the pipeline does by itself once full are recorded as 'autoflush'.
+    """
+    ops = []
+
+    def __init__(self, pipeline, table_name, buffered=False):
+        self.pipeline = pipeline if isinstance(pipeline, MockRedisPipeline) else MockRedisPipeline(None)
+        self.table_name = table_name
+
+    def push(self):
+        self.pipeline.pending += 1
+        if self.pipeline.pending >= self.pipeline.size:
+            MockTable.ops.append(('autoflush', self.table_name, None))
+            self.pipeline.pending = 0
+
+    def set(self, key, fvs):
+        self.push()
+        MockTable.ops.append(('set', self.table_name, key))
+        data = MockConnector.data.setdefault('{}|{}'.format(self.table_name, key), {})
+        for field, value in fvs:
+            data[field] = value
+
+    def hdel(self, key, field):
+        self.push()
+        MockTable.ops.append(('hdel', self.table_name, key))
+        MockConnector.data.get('{}|{}'.format(self.table_name, key), {}).pop(field, None)
+
+    def _del(self, key):
+        self.push()
+        MockTable.ops.append(('del', self.table_name, key))
+        MockConnector.data.pop('{}|{}'.format(self.table_name, key), None)
+
+    def flush(self):
+        self.pipeline.pending = 0
+        MockTable.ops.append(('flush', self.table_name, None))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+    procdockerstatsd process stats benchmark
+
+    Measures the CPU time of one PROCESS_STATS collection cycle on the live
+    /proc, for the single pass ProcessStatsScanner and for the psutil based
+    collection it replaced (kept below as legacy_scan). Both keep their CPU
+    accounting state between cycles, as the daemon does, and the first cycle
+    of each is not measured.
+
+    Usage (from the repository root):
+        python3 -m tests.procdockerstatsd_bench [--cycles N] [--top N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psutil
+
+test_path = os.path.dirname(os.path.abspath(__file__))
+modules_path = os.path.dirname(test_path)
+sys.path.insert(0, modules_path)
+
+
+def load_procdockerstatsd():
+    from swsscommon import swsscommon
+    from sonic_py_common.general import load_module_from_source
+    from tests.mock_connector import MockConnector
+
+    swsscommon.SonicV2Connector = MockConnector
+    return load_module_from_source('procdockerstatsd', os.path.join(modules_path, 'scripts', 'procdockerstatsd'))
+
+
+def legacy_scan(all_process_obj, top_n):
+    """ The psutil based collection of update_processstats_command before the /proc scanner """
+    processdata = []
+    pid_set = set()
+    valid_processes = []
+    for p in psutil.process_iter(['pid', 'ppid', 'memory_percent', 'cpu_percent', 'create_time', 'cmdline']):
+        try:
+            valid_processes.append((p.cpu_percent(), p))
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+    sorted_processes = [p for _, p in sorted(valid_processes, key=lambda x: x[0], reverse=True)]
+    for process_obj in sorted_processes[:top_n]:
+        try:
+            pid = process_obj.pid
+            pid_set.add(pid)
+            process = all_process_obj.setdefault(pid, process_obj)
+            ttime = process.cpu_times()
+            processdata.append({
+                'PID': pid,
+                'UID': process.uids()[0],
+                'PPID': process.ppid(),
+                '%CPU': process.cpu_percent(),
+                '%MEM': process.memory_percent(),
+                'STIME': datetime.utcfromtimestamp(process.create_time()).strftime("%b%d"),
+                'TT': process.terminal(),
+                'TIME': str(timedelta(seconds=int(ttime.user + ttime.system))),
+                'CMD': ' '.join(process.cmdline())
+            })
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
+    for pid in set(all_process_obj) - pid_set:
+        del all_process_obj[pid]
+    return processdata
+
+
+def measure(collect, cycles, interval):
+    collect()
+    results = []
+    for _ in range(cycles):
+        time.sleep(interval)
+        t_cpu = time.process_time()
+        t_wall = time.perf_counter()
+        rows = collect()
+        results.append((time.process_time() - t_cpu, time.perf_counter() - t_wall, len(rows)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='procdockerstatsd process stats benchmark')
+    parser.add_argument('--cycles', type=int, default=10, help='number of measured cycles')
+    parser.add_argument('--top', type=int, default=1024, help='number of processes published')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between cycles')
+    args = parser.parse_args()
+
+    procdockerstatsd = load_procdockerstatsd()
+    scanner = procdockerstatsd.ProcessStatsScanner()
+    all_process_obj = {}
+    implementations = [
+        ('psutil', lambda: legacy_scan(all_process_obj, args.top)),
+        ('procscan', lambda: scanner.scan(args.top))
+    ]
+
+    print('process stats cycle, {} processes, {} cycles (ms)'.format(len(psutil.pids()), args.cycles))
+    print('{:<10} {:>10} {:>10} {:>10} {:>10}'.format('impl', 'cpu min', 'cpu median', 'wall median', 'rows'))
+    for name, collect in implementations:
+        results = measure(collect, args.cycles, args.interval)
+        cpu = [r[0] * 1000 for r in results]
+        wall = [r[1] * 1000 for r in results]
+        print('{:<10} {:>10.1f} {:>10.1f} {:>10.1f} {:>10}'.format(
+            name, min(cpu), statistics.median(cpu), statistics.median(wall), results[-1][2]))
+
+
+if __name__ == '__main__':
+    main()
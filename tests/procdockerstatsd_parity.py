@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+    procdockerstatsd Python/Rust parity and benchmark harness
+
+    Runs one collection cycle of scripts/procdockerstatsd and of the
+    procdockerstatsd-rs binary against the same synthetic host:
+      - a fake /proc tree with --processes processes
+      - --containers containers, as docker and the kernel show them: a
+        containers dir with their config.v2.json and a cgroup v2 tree,
+        which the DOCKER_STATS collector the Python daemon picks reads,
+        and a stub 'docker' binary printing 'docker stats' in the json
+        format the Rust daemon parses
+      - an in-memory STATE_DB: the Python daemon runs with the test mock
+        connectors, the Rust one talks RESP to a small in-memory redis
+        stand-in this harness serves on 127.0.0.1
+
+    The Rust binary runs with --once in a private mount namespace where the
+    fake /proc and a database_config.json pointing at the stand-in are
+    bind mounted, which needs root (as the daemons do).
+
+    The harness reports the tables, keys and fields only one of them
+    publishes, and for each the wall time, the CPU time and max RSS of the
+    process, and the STATE_DB operations of the cycle.
+
+    Usage (from the repository root):
+        python3 -m tests.procdockerstatsd_parity [--rust-bin PATH] [--processes N] [--containers N] [--json]
+"""
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from unittest import mock
+
+test_path = os.path.dirname(os.path.abspath(__file__))
+modules_path = os.path.dirname(test_path)
+sys.path.insert(0, modules_path)
+
+DEFAULT_RUST_BIN = os.path.join(modules_path, 'target', 'release', 'procdockerstatsd-rs')
+COMPARED_TABLES = ['DOCKER_STATS', 'PROCESS_STATS']
+MEM_TOTAL_KB = 8 * 1024 * 1024
+BOOT_TIME = 1751328000
+HOST_NETNS = 'net:[4026531840]'
+
+DOCKER_STUB = '''#!{python}
+import json, sys
+containers = json.load(open({containers!r}))
+if '--format' in sys.argv:
+    for c in containers:
+        print(json.dumps({{'ID': c['id'], 'Name': c['name'], 'CPUPerc': c['cpu'], 'MemPerc': c['mem_perc'],
+                          'MemUsage': c['mem'], 'NetIO': c['net'], 'BlockIO': c['block'], 'PIDs': c['pids']}}))
+else:
+    row = '{{:<15}}   {{:<20}}   {{:<7}}   {{:<20}}   {{:<7}}   {{:<16}}   {{:<16}}   {{}}'
+    print(row.format('CONTAINER ID', 'NAME', 'CPU %', 'MEM USAGE / LIMIT', 'MEM %', 'NET I/O', 'BLOCK I/O', 'PIDS'))
+    for c in containers:
+        print(row.format(c['id'], c['name'], c['cpu'], c['mem'], c['mem_perc'], c['net'], c['block'], c['pids']))
+'''
+
+
+def container_id(index):
+    """ Full id of a container, its first 12 digits are the id 'docker stats' prints """
+    return '{:012x}'.format(0xc0ffee000000 + index) + '0' * 52
+
+
+def make_fake_containers(root, containers):
+    """
+    Containers dir and cgroup v2 tree of the containers, with their init
+    processes taken from the fake /proc (pid 2 onwards, pid 1 holds the host
+    network namespace). The even containers have a private network.
+    """
+    proc = os.path.join(root, 'proc')
+    os.makedirs(os.path.join(proc, '1', 'ns'), exist_ok=True)
+    os.symlink(HOST_NETNS, os.path.join(proc, '1', 'ns', 'net'))
+    cgroup_root = os.path.join(root, 'sys', 'fs', 'cgroup')
+    os.makedirs(cgroup_root)
+    with open(os.path.join(cgroup_root, 'cgroup.controllers'), 'w') as f:
+        f.write('cpuset cpu io memory pids\n')
+    for i in range(containers):
+        cid = container_id(i)
+        pid = i + 2
+        config_dir = os.path.join(root, 'containers', cid)
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, 'config.v2.json'), 'w') as f:
+            json.dump({'Name': '/container{}'.format(i), 'State': {'Running': True, 'Pid': pid}}, f)
+
+        scope = os.path.join('system.slice', 'docker-{}.scope'.format(cid))
+        entry = os.path.join(proc, str(pid))
+        with open(os.path.join(entry, 'cgroup'), 'w') as f:
+            f.write('0::/{}\n'.format(scope))
+        os.makedirs(os.path.join(entry, 'ns'))
+        os.symlink(HOST_NETNS if i % 2 else 'net:[{}]'.format(4026532000 + i), os.path.join(entry, 'ns', 'net'))
+        if not i % 2:
+            os.makedirs(os.path.join(entry, 'net'))
+            with open(os.path.join(entry, 'net', 'dev'), 'w') as f:
+                f.write('Inter-|   Receive                                                |  Transmit\n'
+                        ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n'
+                        '    lo:       0       0    0    0    0     0          0         0        0       0    0    0    0     0       0          0\n'
+                        '  eth0: {0}00 {0} 0 0 0 0 0 0 {0}0 {0} 0 0 0 0 0 0\n'.format(i + 1))
+
+        cgroup = os.path.join(cgroup_root, scope)
+        os.makedirs(cgroup)
+        for name, content in [('cpu.stat', 'usage_usec {}\n'.format(i * 1000)),
+                              ('memory.current', '{}\n'.format((10 + i) * 1048576)),
+                              ('memory.stat', 'inactive_file 0\n'),
+                              ('memory.max', '8322572878\n'),
+                              ('io.stat', '8:0 rbytes={} wbytes={} rios=1 wios=1\n'.format(i * 1000000, i * 1000)),
+                              ('pids.current', '{}\n'.format(i + 1))]:
+            with open(os.path.join(cgroup, name), 'w') as f:
+                f.write(content)
+
+
+def make_fake_host(root, processes, containers, port):
+    """ Create the fake /proc tree and containers, the docker stub and the sonic-db config under root """
+    proc = os.path.join(root, 'proc')
+    os.makedirs(proc)
+    with open(os.path.join(proc, 'meminfo'), 'w') as f:
+        f.write('MemTotal:       {} kB\nMemFree:        {} kB\nMemAvailable:   {} kB\n'.format(
+            MEM_TOTAL_KB, MEM_TOTAL_KB // 2, MEM_TOTAL_KB // 2))
+    with open(os.path.join(proc, 'stat'), 'w') as f:
+        f.write('cpu  1000 0 1000 100000 0 0 0 0 0 0\ncpu0 1000 0 1000 100000 0 0 0 0 0 0\n'
+                'btime {}\nprocesses {}\n'.format(BOOT_TIME, processes))
+    with open(os.path.join(proc, 'uptime'), 'w') as f:
+        f.write('86400.00 86000.00\n')
+    with open(os.path.join(proc, 'cmdline'), 'w') as f:
+        f.write('BOOT_IMAGE=/image/boot/vmlinuz root=UUID=0 rw quiet\n')
+    for pid in range(1, processes + 1):
+        entry = os.path.join(proc, str(pid))
+        os.makedirs(entry)
+        comm = 'proc{}'.format(pid)
+        with open(os.path.join(entry, 'stat'), 'w') as f:
+            f.write('{} ({}) S {} {} {} 0 -1 4194560 100 0 0 0 {} {} 0 0 20 0 1 0 {} 10000000 {} '
+                    '18446744073709551615\n'.format(pid, comm, max(pid - 1, 0), pid, pid,
+                                                    pid * 10, pid * 5, pid * 100, pid * 64))
+        with open(os.path.join(entry, 'status'), 'w') as f:
+            f.write('Name:\t{}\nState:\tS (sleeping)\nPid:\t{}\nPPid:\t{}\nUid:\t0\t0\t0\t0\nGid:\t0\t0\t0\t0\n'
+                    'VmRSS:\t{} kB\n'.format(comm, pid, max(pid - 1, 0), pid * 256))
+        with open(os.path.join(entry, 'cmdline'), 'wb') as f:
+            f.write('/usr/bin/{}\0--id\0{}\0'.format(comm, pid).encode())
+    make_fake_containers(root, containers)
+
+    containers_file = os.path.join(root, 'containers.json')
+    with open(containers_file, 'w') as f:
+        json.dump([{'id': '{:012x}'.format(0xc0ffee000000 + i), 'name': 'container{}'.format(i),
+                    'cpu': '{}.{:02d}%'.format(i, i), 'mem': '{}.5MiB / 7.751GiB'.format(10 + i),
+                    'mem_perc': '0.{:02d}%'.format(i), 'net': '0B / 0B', 'block': '{}MB / {}kB'.format(i, i),
+                    'pids': str(i + 1)} for i in range(containers)], f)
+    bin_dir = os.path.join(root, 'bin')
+    os.makedirs(bin_dir)
+    docker = os.path.join(bin_dir, 'docker')
+    with open(docker, 'w') as f:
+        f.write(DOCKER_STUB.format(python=sys.executable, containers=containers_file))
+    os.chmod(docker, 0o755)
+
+    sonic_db = os.path.join(root, 'run', 'redis', 'sonic-db')
+    os.makedirs(sonic_db)
+    with open(os.path.join(sonic_db, 'database_config.json'), 'w') as f:
+        json.dump({
+            'INSTANCES': {'redis': {'hostname': '127.0.0.1', 'port': port,
+                                    'unix_socket_path': os.path.join(root, 'run', 'redis', 'redis.sock')}},
+            'DATABASES': {name: {'id': db_id, 'separator': '|', 'instance': 'redis'}
+                          for name, db_id in [('APPL_DB', 0), ('CONFIG_DB', 4), ('STATE_DB', 6)]},
+            'VERSION': '1.0'
+        }, f)
+
+
+class MemoryRedis(socketserver.ThreadingTCPServer):
+    """ In-memory redis stand-in with the commands SonicV2Connector uses, counting them """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super(MemoryRedis, self).__init__(('127.0.0.1', 0), MemoryRedisHandler)
+        self.dbs = {}
+        self.ops = Counter()
+        self.lock = threading.Lock()
+
+    def execute(self, db, args):
+        cmd = args[0].decode().upper()
+        self.ops[cmd] += 1
+        data = self.dbs.setdefault(db, {})
+        if cmd in ('PING',):
+            return 'PONG'
+        if cmd in ('CLIENT', 'AUTH', 'HELLO'):
+            return 'OK'
+        if cmd in ('HSET', 'HMSET'):
+            fvs = data.setdefault(args[1], {})
+            added = 0
+            for i in range(2, len(args) - 1, 2):
+                added += args[i] not in fvs
+                fvs[args[i]] = args[i + 1]
+            return added if cmd == 'HSET' else 'OK'
+        if cmd == 'HGET':
+            return data.get(args[1], {}).get(args[2])
+        if cmd == 'HGETALL':
+            return [v for kv in data.get(args[1], {}).items() for v in kv]
+        if cmd == 'HDEL':
+            fvs = data.get(args[1], {})
+            return sum(fvs.pop(field, None) is not None for field in args[2:])
+        if cmd == 'DEL':
+            return sum(data.pop(key, None) is not None for key in args[1:])
+        if cmd == 'EXISTS':
+            return sum(key in data for key in args[1:])
+        if cmd == 'KEYS':
+            pattern = args[1].decode()
+            return [key for key in data if fnmatch.fnmatchcase(key.decode(), pattern)]
+        return RuntimeError('unsupported command ' + cmd)
+
+    def table_data(self, db=6):
+        return {key.decode(): {f.decode(): v.decode() for f, v in fvs.items()}
+                for key, fvs in self.dbs.get(db, {}).items()}
+
+
+class MemoryRedisHandler(socketserver.StreamRequestHandler):
+    # Replies are flushed once complete
+    wbufsize = 65536
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def write_reply(self, reply):
+        if reply is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(reply, RuntimeError):
+            self.wfile.write('-ERR {}\r\n'.format(reply).encode())
+        elif isinstance(reply, str):
+            self.wfile.write('+{}\r\n'.format(reply).encode())
+        elif isinstance(reply, int):
+            self.wfile.write(':{}\r\n'.format(reply).encode())
+        elif isinstance(reply, bytes):
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(reply), reply))
+        else:
+            self.wfile.write(b'*%d\r\n' % len(reply))
+            for item in reply:
+                self.write_reply(item)
+
+    def handle(self):
+        db = 0
+        while True:
+            args = self.read_command()
+            if not args:
+                return
+            if args[0].upper() == b'SELECT':
+                db = int(args[1])
+                self.server.ops['SELECT'] += 1
+                reply = 'OK'
+            else:
+                with self.server.lock:
+                    reply = self.server.execute(db, args)
+            self.write_reply(reply)
+            self.wfile.flush()
+
+
+def run_python_child(root):
+    """ One collection cycle of scripts/procdockerstatsd, prints the STATE_DB and its operations as json """
+    from swsscommon import swsscommon
+    from sonic_py_common.general import load_module_from_source
+    from tests.mock_connector import MockConnector, MockRedisPipeline, MockTable
+
+    ops = Counter()
+
+    class CountingConnector(MockConnector):
+        def __getattribute__(self, name):
+            if name in ('get', 'set', 'hmset', 'keys', 'get_all', 'delete', 'delete_all_by_pattern'):
+                ops[name] += 1
+            return super(CountingConnector, self).__getattribute__(name)
+
+    swsscommon.SonicV2Connector = CountingConnector
+    procdockerstatsd = load_module_from_source('procdockerstatsd', os.path.join(modules_path, 'scripts', 'procdockerstatsd'))
+    vmem = mock.Mock(total=MEM_TOTAL_KB * 1024)
+    # The collectors read the host paths given as default arguments, point them to the fake host
+    cgroup_defaults = (os.path.join(root, 'containers'), os.path.join(root, 'sys', 'fs', 'cgroup'), os.path.join(root, 'proc'))
+    with mock.patch.object(procdockerstatsd.CgroupDockerStats.__init__, '__defaults__', cgroup_defaults), \
+            mock.patch.object(procdockerstatsd.CgroupDockerStats.is_supported, '__defaults__', cgroup_defaults[1:2]), \
+            mock.patch.object(procdockerstatsd.DockerApiStats.is_supported, '__defaults__',
+                              (os.path.join(root, 'run', 'docker.sock'),)), \
+            mock.patch.object(procdockerstatsd.swsscommon, 'DBConnector', create=True), \
+            mock.patch.object(procdockerstatsd.swsscommon, 'RedisPipeline', MockRedisPipeline, create=True), \
+            mock.patch.object(procdockerstatsd.swsscommon, 'Table', MockTable, create=True), \
+            mock.patch('procdockerstatsd.psutil.virtual_memory', return_value=vmem), \
+            mock.patch('procdockerstatsd.psutil.boot_time', return_value=BOOT_TIME):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        # The DOCKER_STATS collector the daemon deploys on the host
+        pdstatsd.docker_stats = pdstatsd.create_docker_stats_collector()
+        pdstatsd.process_scanner = procdockerstatsd.ProcessStatsScanner(os.path.join(root, 'proc'))
+        ops.clear()
+        MockTable.ops = []
+        t_cpu = time.process_time()
+        t_wall = time.perf_counter()
+        pdstatsd.update_dockerstats_command()
+        pdstatsd.update_processstats_command()
+        cycle = {'wall': time.perf_counter() - t_wall, 'cpu': time.process_time() - t_cpu}
+
+    table_ops = Counter(op for op, _, _ in MockTable.ops)
+    print(json.dumps({
+        'collector': type(pdstatsd.docker_stats).__name__ if pdstatsd.docker_stats else 'docker CLI',
+        'db': MockConnector.data,
+        'ops': dict(ops + Counter({'table.' + op: count for op, count in table_ops.items()})),
+        'round_trips': sum(ops.values()) + table_ops['flush'] + table_ops['autoflush'],
+        'cycle': cycle
+    }))
+
+
+def run_measured(cmd, env):
+    """ Run cmd, returns (stdout, wall seconds, cpu seconds, max rss kB) of it and its children """
+    t_wall = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, universal_newlines=True)
+    stdout = proc.stdout.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - t_wall
+    if proc.returncode != 0:
+        raise RuntimeError('{} exited with {}'.format(cmd, proc.returncode))
+    return stdout, wall, rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss
+
+
+def run_python(root, env):
+    cmd = [sys.executable, '-m', 'tests.procdockerstatsd_parity', '--child', root]
+    stdout, wall, cpu, rss = run_measured(cmd, env)
+    child = json.loads(stdout.strip().splitlines()[-1])
+    return {'collector': child['collector'], 'db': child['db'], 'ops': child['ops'], 'round_trips': child['round_trips'],
+            'wall': wall, 'cpu': cpu, 'rss_kb': rss, 'cycle': child['cycle']}
+
+
+def run_rust(root, env, rust_bin, server):
+    script = ('mount --bind "$1/proc" /proc && mount --bind "$1/run" /var/run && exec "$2" --once')
+    cmd = ['unshare', '--mount', '--propagation', 'private', '--fork', '--', 'sh', '-c', script, 'sh', root, rust_bin]
+    server.ops.clear()
+    _, wall, cpu, rss = run_measured(cmd, env)
+    ops = dict(server.ops)
+    return {'db': server.table_data(), 'ops': ops, 'round_trips': sum(ops.values()),
+            'wall': wall, 'cpu': cpu, 'rss_kb': rss}
+
+
+def table_shape(db, table):
+    """ {key: sorted fields} of the table, without its LastUpdateTime key """
+    prefix = table + '|'
+    return {key: sorted(fvs) for key, fvs in db.items()
+            if key.startswith(prefix) and key != prefix + 'LastUpdateTime'}
+
+
+def db_tables(db):
+    return {key.split('|', 1)[0] for key in db if '|' in key}
+
+
+def compare(python_db, rust_db):
+    """ Returns the list of the parity differences: tables, keys and fields published by one side only """
+    diffs = []
+    py_tables, rs_tables = db_tables(python_db), db_tables(rust_db)
+    for table in sorted(py_tables - rs_tables):
+        diffs.append('{}: table only published by Python'.format(table))
+    for table in sorted(rs_tables - py_tables):
+        diffs.append('{}: table only published by Rust'.format(table))
+    for table in sorted(py_tables & rs_tables):
+        py, rs = table_shape(python_db, table), table_shape(rust_db, table)
+        for key in sorted(set(py) - set(rs)):
+            diffs.append('{}: only published by Python'.format(key))
+        for key in sorted(set(rs) - set(py)):
+            diffs.append('{}: only published by Rust'.format(key))
+        for key in sorted(set(py) & set(rs)):
+            if py[key] != rs[key]:
+                diffs.append('{}: fields only in Python {}, only in Rust {}'.format(
+                    key, sorted(set(py[key]) - set(rs[key])), sorted(set(rs[key]) - set(py[key]))))
+    return diffs
+
+
+def print_report(report):
+    print('{:<8} {:>10} {:>10} {:>10} {:>10} {:>8} {:>8}'.format(
+        'impl', 'wall ms', 'cpu ms', 'rss kB', 'db ops', 'rtt', 'keys'))
+    for name in ['python', 'rust']:
+        r = report.get(name)
+        if not r:
+            print('{:<8} {}'.format(name, report.get(name + '_skipped', 'skipped')))
+            continue
+        keys = sum(len(table_shape(r['db'], table)) for table in COMPARED_TABLES)
+        print('{:<8} {:>10.1f} {:>10.1f} {:>10} {:>10} {:>8} {:>8}'.format(
+            name, r['wall'] * 1000, r['cpu'] * 1000, r['rss_kb'], sum(r['ops'].values()), r['round_trips'], keys))
+    if 'python' in report:
+        print('python DOCKER_STATS collector: {}'.format(report['python']['collector']))
+        cycle = report['python']['cycle']
+        print('python cycle alone: {:.1f} ms wall, {:.1f} ms cpu'.format(cycle['wall'] * 1000, cycle['cpu'] * 1000))
+    if 'diffs' in report:
+        print('parity: {}'.format('identical key/field sets' if not report['diffs'] else
+                                  '{} differences'.format(len(report['diffs']))))
+        for diff in report['diffs']:
+            print('  ' + diff)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='procdockerstatsd Python/Rust parity and benchmark harness')
+    parser.add_argument('--rust-bin', default=DEFAULT_RUST_BIN, help='procdockerstatsd-rs binary')
+    parser.add_argument('--processes', type=int, default=300, help='processes in the fake /proc')
+    parser.add_argument('--containers', type=int, default=20, help='containers of the docker stub')
+    parser.add_argument('--json', action='store_true', help='print the report as json')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.processes <= args.containers:
+        parser.error('the containers init processes are taken from the processes, --processes must exceed --containers')
+
+    if args.child:
+        run_python_child(args.child)
+        return
+
+    server = MemoryRedis()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = tempfile.mkdtemp(prefix='procdockerstatsd-parity-')
+    report = {}
+    try:
+        make_fake_host(root, args.processes, args.containers, server.server_address[1])
+        env = dict(os.environ, PATH=os.path.join(root, 'bin') + os.pathsep + os.environ.get('PATH', ''))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [modules_path, env.get('PYTHONPATH')]))
+        report['python'] = run_python(root, env)
+        if not os.path.exists(args.rust_bin):
+            report['rust_skipped'] = 'not built ({}), run cargo build --release'.format(args.rust_bin)
+        elif os.getuid() != 0:
+            report['rust_skipped'] = 'needs root for the mount namespace'
+        else:
+            report['rust'] = run_rust(root, env, args.rust_bin, server)
+            report['diffs'] = compare(report['python']['db'], report['rust']['db'])
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print_report(report)
+    sys.exit(1 if report.get('diffs') else 0)
+
+
+if __name__ == '__main__':
+    main()
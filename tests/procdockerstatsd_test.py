@@ -1,13 +1,21 @@
 import sys
 import os
-import psutil
+import json
+import shutil
+import socketserver
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
 import pytest
-from unittest.mock import call, patch
+from unittest import mock
+from unittest.mock import patch
 from swsscommon import swsscommon
 from sonic_py_common.general import load_module_from_source
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 
-from .mock_connector import MockConnector
+from .mock_connector import MockConnector, MockRedisPipeline, MockTable
+from .common.mock_configdb import MockConfigDb, MockSelect, MockSubscriberStateTable
 
 swsscommon.SonicV2Connector = MockConnector
 
@@ -20,61 +28,25 @@ sys.path.insert(0, modules_path)
 procdockerstatsd_path = os.path.join(scripts_path, 'procdockerstatsd')
 procdockerstatsd = load_module_from_source('procdockerstatsd', procdockerstatsd_path)
 
-class MockProcess:
-    def __init__(self, uids, pid, ppid, memory_percent, cpu_percent, create_time, cmdline, user_time, system_time):
-        self._uids = uids
-        self._pid = pid
-        self._ppid = ppid
-        self._memory_percent = memory_percent
-        self._cpu_percent = cpu_percent
-        self._create_time = create_time
-        self._terminal = cmdline
-        self._cmdline = cmdline
-        self._user_time = user_time
-        self._system_time = system_time
-
-    def uids(self):
-        return self._uids
-
-    @property
-    def pid(self):
-        return self._pid
-
-    def ppid(self):
-        return self._ppid
-
-    def memory_percent(self):
-        return self._memory_percent
-
-    def cpu_percent(self):
-        return self._cpu_percent
-
-    def create_time(self):
-        return self._create_time
-
-    def terminal(self):
-        return self._terminal
-
-    def cmdline(self):
-        return self._cmdline
-
-    def cpu_times(self):
-        class CPUTimes:
-            def __init__(self, user_time, system_time):
-                self.user = user_time
-                self.system = system_time
-
-            def __getitem__(self, index):
-                if index == 0:
-                    return self.user
-                else:
-                    return self.system
 
-            def __iter__(self):
-                yield self.user
-                yield self.system
+@pytest.fixture(autouse=True)
+def mock_state_db_pipeline():
+    with patch.object(procdockerstatsd.swsscommon, 'DBConnector', create=True), \
+            patch.object(procdockerstatsd.swsscommon, 'RedisPipeline', MockRedisPipeline, create=True), \
+            patch.object(procdockerstatsd.swsscommon, 'Table', MockTable, create=True):
+        MockTable.ops = []
+        yield
 
-        return CPUTimes(self._user_time, self._system_time)
+def make_proc_entry(proc_root, pid, comm, ppid, uid, utime, stime, starttime, rss, cmdline, tty_nr=0):
+    """ Write the /proc/<pid> files ProcessStatsScanner reads """
+    entry = proc_root / str(pid)
+    entry.mkdir(parents=True, exist_ok=True)
+    (entry / 'stat').write_text(
+        '{} ({}) S {} {} {} {} -1 4194560 100 0 0 0 {} {} 0 0 20 0 1 0 {} 10000000 {} 18446744073709551615\n'.format(
+            pid, comm, ppid, pid, pid, tty_nr, utime, stime, starttime, rss))
+    (entry / 'status').write_text('Name:\t{}\nUmask:\t0022\nState:\tS (sleeping)\nUid:\t{}\t{}\t{}\t{}\n'.format(
+        comm, uid, uid, uid, uid))
+    (entry / 'cmdline').write_bytes(b'\0'.join(arg.encode() for arg in cmdline) + (b'\0' if cmdline else b''))
 
 
 class TestProcDockerStatsDaemon(object):
@@ -109,33 +81,108 @@ class TestProcDockerStatsDaemon(object):
         output = pdstatsd.run_command([sys.executable, "-c", "import sys; sys.exit(6)"])
         assert output is None
 
-    def test_update_processstats_command(self):
+    def test_update_processstats_command(self, tmp_path):
         pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
-        current_time = datetime.now()
-        valid_create_time1 = int((current_time - timedelta(days=1)).timestamp())
-        valid_create_time2 = int((current_time - timedelta(days=2)).timestamp())
-        # Create a list of mocked processes
-        mocked_processes = [
-            MockProcess(uids=[1000], pid=1234, ppid=0, memory_percent=10.5, cpu_percent=99.0, create_time=valid_create_time1, cmdline=['python', 'script.py'], user_time=1.5, system_time=2.0),
-            MockProcess(uids=[1000], pid=5678, ppid=0, memory_percent=5.5, cpu_percent=15.5, create_time=valid_create_time2, cmdline=['bash', 'script.sh'], user_time=3.5, system_time=4.0),
-            MockProcess(uids=[1000], pid=3333, ppid=0, memory_percent=5.5, cpu_percent=15.5, create_time=valid_create_time2, cmdline=['bash', 'script.sh'], user_time=3.5, system_time=4.0)
-        ]
-        mocked_processes2 = [
-            MockProcess(uids=[1000], pid=1234, ppid=0, memory_percent=10.5, cpu_percent=20.5, create_time=valid_create_time1, cmdline=['python', 'script.py'], user_time=1.5, system_time=2.0),
-            MockProcess(uids=[1000], pid=6666, ppid=0, memory_percent=5.5, cpu_percent=15.5, create_time=valid_create_time2, cmdline=['bash', 'script.sh'], user_time=3.5, system_time=4.0)
-        ]
-
-        with patch("procdockerstatsd.psutil.process_iter", return_value=mocked_processes) as mock_process_iter:
-            pdstatsd.all_process_obj = {1234: mocked_processes2[0],
-                                        6666: mocked_processes2[1]}
+        pdstatsd.process_scanner = procdockerstatsd.ProcessStatsScanner(str(tmp_path))
+        pdstatsd.process_scanner.clock_ticks = 100
+        pdstatsd.process_scanner.page_size = 4096
+        pdstatsd.process_scanner.boot_time = datetime(2025, 7, 1, tzinfo=timezone.utc).timestamp()
+        make_proc_entry(tmp_path, 1234, 'python', 1, 1000, 150, 200, 8640000, 25600, ['python', 'script.py'])
+        make_proc_entry(tmp_path, 5678, 'bash', 1, 0, 350, 400, 100, 12800, ['bash', 'script.sh'], tty_nr=34816)
+        make_proc_entry(tmp_path, 2, 'kthreadd', 0, 0, 0, 0, 1, 0, [])
+        (tmp_path / 'self').mkdir()
+
+        with patch('procdockerstatsd.time.monotonic', return_value=100.0), \
+                patch('procdockerstatsd.psutil.virtual_memory') as mock_vmem, \
+                patch.object(pdstatsd.process_scanner, 'terminal', side_effect=lambda tty_nr: '/dev/pts/0' if tty_nr else None):
+            mock_vmem.return_value.total = 1048576000
             pdstatsd.update_processstats_command()
-            mock_process_iter.assert_called_once()
-        assert(len(pdstatsd.all_process_obj)== 3)
-
-        expected_fields = {'UID', 'PPID', '%CPU', '%MEM', 'STIME', 'TT', 'TIME', 'CMD'}
-        for field in expected_fields:
-            value = pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|1234', field)
-            assert value is not None, f"Missing expected field: {field}"
+            assert pdstatsd.state_db.get_all('STATE_DB', 'PROCESS_STATS|1234') == {
+                'UID': '1000', 'PPID': '1', '%CPU': '0.0', '%MEM': '10.0', 'STIME': 'Jul02',
+                'TT': 'None', 'TIME': '0:00:03', 'CMD': 'python script.py'
+            }
+            assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|5678', 'TT') == '/dev/pts/0'
+            assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|2', 'CMD') == ''
+
+            # CPU% from the ticks delta, a recycled pid starts over
+            make_proc_entry(tmp_path, 1234, 'python', 1, 1000, 1150, 200, 8640000, 25600, ['python', 'script.py'])
+            make_proc_entry(tmp_path, 5678, 'bash', 1, 0, 1350, 400, 200, 12800, ['bash', 'script.sh'])
+            with patch('procdockerstatsd.time.monotonic', return_value=110.0):
+                pdstatsd.update_processstats_command()
+            assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|1234', '%CPU') == '100.0'
+            assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|5678', '%CPU') == '0.0'
+
+    def test_process_stats_scanner_top_n(self, tmp_path):
+        scanner = procdockerstatsd.ProcessStatsScanner(str(tmp_path))
+        scanner.clock_ticks = 100
+        for pid in range(10, 20):
+            make_proc_entry(tmp_path, pid, 'proc', 1, 0, 0, 0, pid, 10, ['proc{}'.format(pid)])
+        with patch('procdockerstatsd.time.monotonic', return_value=100.0):
+            scanner.scan(3)
+        for pid in range(10, 20):
+            make_proc_entry(tmp_path, pid, 'proc', 1, 0, pid * 10, 0, pid, 10, ['proc{}'.format(pid)])
+
+        opened = []
+        real_open = open
+
+        def tracking_open(path, *args, **kwargs):
+            opened.append(path)
+            return real_open(path, *args, **kwargs)
+
+        with patch('procdockerstatsd.time.monotonic', return_value=110.0), \
+                patch('builtins.open', side_effect=tracking_open):
+            rows = scanner.scan(3)
+        assert [row['PID'] for row in rows] == [19, 18, 17]
+        assert [row['%CPU'] for row in rows] == [19.0, 18.0, 17.0]
+        # cmdline and status are only read for the selected processes
+        assert sorted(os.path.basename(os.path.dirname(path)) for path in opened if path.endswith('cmdline')) == ['17', '18', '19']
+        assert len([path for path in opened if path.endswith('status')]) == 3
+        assert len([path for path in opened if path.endswith('stat')]) == 10
+
+    def test_process_stats_memory_detail(self, tmp_path):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        scanner = pdstatsd.process_scanner = procdockerstatsd.ProcessStatsScanner(str(tmp_path))
+        scanner.clock_ticks = 100
+        for pid, rss in [(10, 100), (11, 300), (12, 200), (13, 50)]:
+            make_proc_entry(tmp_path, pid, 'proc', 1, 0, 0, 0, pid, rss, ['proc{}'.format(pid)])
+            (tmp_path / str(pid) / 'smaps_rollup').write_text(
+                '00400000-7ffd1e5f1000 ---p 00000000 00:00 0                          [rollup]\n'
+                'Rss:                {} kB\n'
+                'Pss:                {} kB\n'
+                'Shared_Clean:        200 kB\n'
+                'Private_Clean:       {} kB\n'
+                'Private_Dirty:       {} kB\n'
+                'Swap:                {} kB\n'.format(rss * 4, pid * 10, pid, pid * 2, pid * 3))
+        # No smaps_rollup read unless configured
+        with patch('procdockerstatsd.time.monotonic', return_value=100.0):
+            assert all('PSS' not in row for row in scanner.scan(1))
+
+        pdstatsd.collector_config_update('PROCESS_STATS', 'SET', {'memory_detail_top': '2'})
+        assert scanner.memory_detail == (2, 0.05)
+        with patch('procdockerstatsd.time.monotonic', return_value=100.0), \
+                patch('procdockerstatsd.psutil.virtual_memory') as mock_vmem:
+            mock_vmem.return_value.total = 1048576000
+            pdstatsd.update_processstats_command()
+        # The top processes by RSS are published even when not in the top N by CPU
+        assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|11', 'PSS_BYTES') == str(110 * 1024)
+        assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|11', 'USS_BYTES') == str(33 * 1024)
+        assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|11', 'SWAP_BYTES') == str(33 * 1024)
+        assert pdstatsd.state_db.get('STATE_DB', 'PROCESS_STATS|12', 'PSS_BYTES') == str(120 * 1024)
+        assert 'PSS_BYTES' not in pdstatsd.state_db.get_all('STATE_DB', 'PROCESS_STATS|10')
+
+        # The reads stop once the budget is spent, largest RSS first
+        with patch('procdockerstatsd.time.monotonic', return_value=110.0), \
+                patch('procdockerstatsd.time.perf_counter', side_effect=[0.0, 0.01, 0.06]):
+            rows = scanner.scan(0)
+        assert [(row['PID'], row['PSS']) for row in rows] == [(11, 110 * 1024)]
+
+        with patch.object(pdstatsd, 'log_error') as mock_log_error:
+            pdstatsd.collector_config_update('PROCESS_STATS', 'SET', {'memory_detail_top': '-1'})
+            pdstatsd.collector_config_update('PROCESS_STATS', 'SET', {'memory_detail_budget_ms': 'fast'})
+            assert mock_log_error.call_count == 2
+        assert scanner.memory_detail == (2, 0.05)
+        pdstatsd.collector_config_update('PROCESS_STATS', 'DEL', {})
+        assert scanner.memory_detail == (0, 0.05)
 
     @patch('procdockerstatsd.getstatusoutput_noshell_pipe', return_value=([0, 0], ''))
     def test_update_fipsstats_command(self, mock_cmd):
@@ -144,25 +191,74 @@ class TestProcDockerStatsDaemon(object):
         assert pdstatsd.state_db.get('STATE_DB', 'FIPS_STATS|state', 'enforced') == "False"
         assert pdstatsd.state_db.get('STATE_DB', 'FIPS_STATS|state', 'enabled') == "True"
 
-    def test_update_processstats_handles_nosuchprocess(self):
+    def test_update_fipsstats_command_cached(self, tmp_path):
+        openssl_cnf = tmp_path / 'openssl.cnf'
+        openssl_cnf.write_text('openssl_conf = openssl_init\n')
         pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
-        current_time = datetime.now()
-        valid_create_time = int((current_time - timedelta(hours=1)).timestamp())
-        good_proc = MockProcess(uids=[1000], pid=1234, ppid=0, memory_percent=10.5, cpu_percent=99.0,
-                                create_time=valid_create_time, cmdline=['python'], user_time=1.0, system_time=1.0)
+        with patch('procdockerstatsd.OPENSSL_CONFIG_FILES', [str(openssl_cnf), str(tmp_path / 'fips_enable')]), \
+                patch('procdockerstatsd.getstatusoutput_noshell_pipe', return_value=([0, 0], '')) as mock_cmd, \
+                patch('procdockerstatsd.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = datetime(2025, 7, 1, 12, 0, 0)
+            pdstatsd.update_fipsstats_command()
+            mock_datetime.utcnow.return_value = datetime(2025, 7, 1, 12, 2, 0)
+            pdstatsd.update_fipsstats_command()
+            # Evaluated once, published with a fresh timestamp
+            assert mock_cmd.call_count == 1
+            assert pdstatsd.state_db.get('STATE_DB', 'FIPS_STATS|state', 'timestamp') == '2025-07-01T12:02:00'
+
+            # A FIPS configuration change
+            mock_cmd.return_value = ([0, 1], '')
+            pdstatsd.fips_config_update('global', 'SET', {'enable': 'false'})
+            assert pdstatsd.collectors['FIPS_STATS'].next_run <= time.monotonic()
+            pdstatsd.update_fipsstats_command()
+            assert mock_cmd.call_count == 2
+            assert pdstatsd.state_db.get('STATE_DB', 'FIPS_STATS|state', 'enabled') == "False"
 
-        class NoSuchProcessMock(MockProcess):
-            def cpu_percent(self):
-                raise psutil.NoSuchProcess(pid=self._pid)
+            # An OpenSSL configuration change
+            (tmp_path / 'fips_enable').write_text('1')
+            pdstatsd.update_fipsstats_command()
+            pdstatsd.update_fipsstats_command()
+            assert mock_cmd.call_count == 3
 
-        bad_proc = NoSuchProcessMock(uids=[1000], pid=9999, ppid=0, memory_percent=0, cpu_percent=0,
-                                    create_time=valid_create_time, cmdline=['fake'], user_time=0, system_time=0)
+    def test_fips_config_update_dispatched(self, tmp_path):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        collector = pdstatsd.collectors['FIPS_STATS']
+        with patch('procdockerstatsd.OPENSSL_CONFIG_FILES', [str(tmp_path / 'openssl.cnf')]), \
+                patch('procdockerstatsd.getstatusoutput_noshell_pipe', return_value=([0, 0], '')) as mock_cmd, \
+                patch.object(pdstatsd, 'update_dockerstats_command'), \
+                patch.object(pdstatsd, 'update_processstats_command'), \
+                patch.object(pdstatsd, 'log_error') as mock_log_error:
+            pdstatsd.dispatch_collectors(1000.0)
+            collector.future.result()
+            assert pdstatsd.state_db.get('STATE_DB', 'FIPS_STATS|state', 'enabled') == "True"
+
+            # The status is evaluated again and published on the next dispatch
+            mock_cmd.return_value = ([0, 1], '')
+            with patch('procdockerstatsd.time.monotonic', return_value=1010.0):
+                pdstatsd.fips_config_update('global', 'SET', {'enable': 'false'})
+            pdstatsd.dispatch_collectors(1010.0)
+            collector.future.result()
+            mock_log_error.assert_not_called()
+        assert mock_cmd.call_count == 2
+        assert pdstatsd.fips_stamp[0] == pdstatsd.fips_generation
+        assert pdstatsd.state_db.get('STATE_DB', 'FIPS_STATS|state', 'enabled') == "False"
+        assert collector.next_publish == 1010.0 + collector.interval
+
+    def test_update_processstats_handles_exited_process(self, tmp_path):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        pdstatsd.process_scanner = procdockerstatsd.ProcessStatsScanner(str(tmp_path))
+        make_proc_entry(tmp_path, 1234, 'python', 1, 1000, 100, 100, 1000, 100, ['python'])
+        # Exited before its stat file was read
+        (tmp_path / '9999').mkdir()
+        # Exited after its stat file was read
+        make_proc_entry(tmp_path, 8888, 'fake', 1, 0, 0, 0, 1000, 0, ['fake'])
+        (tmp_path / '8888' / 'status').unlink()
 
-        with patch("procdockerstatsd.psutil.process_iter", return_value=[good_proc, bad_proc]):
-            pdstatsd.update_processstats_command()
+        pdstatsd.update_processstats_command()
 
-        assert 1234 in pdstatsd.all_process_obj
-        assert 9999 not in pdstatsd.all_process_obj
+        assert 'PROCESS_STATS|1234' in MockConnector.data
+        assert 'PROCESS_STATS|9999' not in MockConnector.data
+        assert 'PROCESS_STATS|8888' not in MockConnector.data
 
     def test_datetime_utcnow_usage(self):
         """Test that datetime.utcnow() is used instead of datetime.now() for consistent UTC timestamps"""
@@ -201,30 +297,517 @@ class TestProcDockerStatsDaemon(object):
                             assert mock_datetime.utcnow.call_count >= 2        
 
     def test_run_method_executes_with_utcnow(self):
-        """Test that run method executes and uses datetime.utcnow()"""
+        """Test that run method starts every collector and stamps them with datetime.utcnow()"""
         pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
-        
-        # Mock all dependencies but allow datetime.utcnow() to run normally
-        with patch.object(pdstatsd, 'update_dockerstats_command'):
-            with patch.object(pdstatsd, 'update_processstats_command'):
-                with patch.object(pdstatsd, 'update_fipsstats_command'):
-                    with patch('time.sleep', side_effect=Exception("Stop after first iteration")):
-                        with patch('os.getuid', return_value=0):  # Mock as root
-                            with patch.object(pdstatsd, 'log_info'):
-                                with patch.object(pdstatsd, 'update_state_db') as mock_update_db:
-                                    # This will actually call run() method
-                                    try:
-                                        pdstatsd.run()
-                                    except Exception as e:
-                                        if "Stop after first iteration" in str(e):
-                                            # Verify that update_state_db was called
-                                            assert mock_update_db.call_count >= 3
-                                            # Verify that timestamps were passed
-                                            for call in mock_update_db.call_args_list:
-                                                args = call[0]
-                                                if len(args) >= 3 and 'lastupdate' in args[1]:
-                                                    timestamp_str = args[2]
-                                                    assert isinstance(timestamp_str, str)
-                                                    assert len(timestamp_str) > 0
-                                        else:
-                                            raise
+        MockConfigDb.set_config_db({'PROCDOCKERSTATSD': {'PROCESS_STATS': {'interval': '10', 'jitter': '2'}}})
+        MockSelect.set_event_queue([('PROCDOCKERSTATSD', 'PROCESS_STATS')])
+        # No configuration pending at startup, the change comes after the first collections
+        MockSelect.NUM_TIMEOUT_TRIES = 1
+
+        with patch.object(pdstatsd, 'update_dockerstats_command') as mock_docker, \
+                patch.object(pdstatsd, 'update_processstats_command') as mock_process, \
+                patch.object(pdstatsd, 'update_fipsstats_command') as mock_fips, \
+                patch.object(procdockerstatsd.swsscommon, 'Select', MockSelect, create=True), \
+                patch.object(procdockerstatsd.swsscommon, 'SubscriberStateTable', MockSubscriberStateTable, create=True), \
+                patch('os.getuid', return_value=0), \
+                patch.object(pdstatsd, 'log_info'), \
+                patch.object(pdstatsd, 'update_state_db') as mock_update_db:
+            # MockSelect raises TimeoutError once the event queue is empty
+            with pytest.raises(TimeoutError):
+                pdstatsd.run()
+            for collector in pdstatsd.collectors.values():
+                collector.future.result()
+            for mock_command in (mock_docker, mock_process, mock_fips):
+                mock_command.assert_called_once()
+
+        assert mock_update_db.call_count == 3
+        for args, _ in mock_update_db.call_args_list:
+            assert args[0] in ('DOCKER_STATS|LastUpdateTime', 'PROCESS_STATS|LastUpdateTime', 'FIPS_STATS|LastUpdateTime')
+            assert args[1] == 'lastupdate'
+            assert datetime.strptime(args[2], '%Y-%m-%d %H:%M:%S.%f')
+        process_collector = pdstatsd.collectors['PROCESS_STATS']
+        assert (process_collector.interval, process_collector.jitter) == (10, 2)
+        assert process_collector.next_run == process_collector.started + 10
+        assert pdstatsd.collectors['DOCKER_STATS'].interval == 120
+
+    def test_dispatch_collectors_skips_overrun(self):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        release = threading.Event()
+        pdstatsd.collectors['DOCKER_STATS'].configure({'timeout': '200', 'sample_interval': '0'})
+        pdstatsd.collectors['PROCESS_STATS'].configure({'sample_interval': '0'})
+        pdstatsd.collectors['FIPS_STATS'].configure({'interval': '600'})
+
+        with patch.object(pdstatsd, 'update_dockerstats_command', side_effect=lambda: release.wait(10)) as mock_docker, \
+                patch.object(pdstatsd, 'update_processstats_command') as mock_process, \
+                patch.object(pdstatsd, 'update_fipsstats_command') as mock_fips, \
+                patch.object(pdstatsd, 'update_state_db'), \
+                patch.object(pdstatsd, 'log_warning') as mock_log_warning, \
+                patch.object(pdstatsd, 'log_error') as mock_log_error:
+            assert pdstatsd.dispatch_collectors(1000.0) == 120
+            pdstatsd.collectors['PROCESS_STATS'].future.result()
+
+            # The docker collection is still running, only its own cycle is skipped
+            assert pdstatsd.dispatch_collectors(1120.0) == 120
+            pdstatsd.collectors['PROCESS_STATS'].future.result()
+            mock_log_warning.assert_called_once_with('DOCKER_STATS collection still running, skipping this cycle')
+            # Over its timeout
+            assert pdstatsd.dispatch_collectors(1240.0) == 120
+            pdstatsd.collectors['PROCESS_STATS'].future.result()
+            assert mock_log_error.call_count == 1
+
+            release.set()
+            pdstatsd.collectors['DOCKER_STATS'].future.result()
+            pdstatsd.dispatch_collectors(1360.0)
+            pdstatsd.collectors['DOCKER_STATS'].future.result()
+            pdstatsd.collectors['PROCESS_STATS'].future.result()
+
+            assert mock_docker.call_count == 2
+            assert mock_process.call_count == 4
+            assert mock_fips.call_count == 1
+
+    def test_overrunning_collector_recovers(self):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        pdstatsd.docker_stats = None
+        pdstatsd.collector_config_update('DOCKER_STATS', 'SET', {'timeout': '0.5', 'sample_interval': '0'})
+        collector = pdstatsd.collectors['DOCKER_STATS']
+        real_popen = subprocess.Popen
+        procs = []
+
+        def hanging_docker(cmd, **kwargs):
+            procs.append(real_popen(['sleep', '30'], **kwargs))
+            return procs[-1]
+
+        with patch('procdockerstatsd.subprocess.Popen', side_effect=hanging_docker), \
+                patch.object(pdstatsd, 'update_processstats_command'), \
+                patch.object(pdstatsd, 'update_fipsstats_command'), \
+                patch.object(pdstatsd, 'update_state_db'), \
+                patch.object(pdstatsd, 'log_error') as mock_log_error:
+            pdstatsd.dispatch_collectors(1000.0)
+            # The hung 'docker stats' is killed once over the timeout, the collector thread is freed
+            collector.future.result(timeout=10)
+            assert procs[0].returncode is not None
+            assert any('killed' in c.args[0] for c in mock_log_error.call_args_list)
+
+            pdstatsd.dispatch_collectors(1120.0)
+            collector.future.result(timeout=10)
+            assert len(procs) == 2
+
+    def test_docker_api_timeout_config(self):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        pdstatsd.docker_stats = procdockerstatsd.DockerApiStats('/nonexistent.sock', workers=1)
+        pdstatsd.collector_config_update('DOCKER_STATS', 'SET', {'timeout': '3'})
+        assert pdstatsd.docker_stats.timeout == 3
+        pdstatsd.collector_config_update('DOCKER_STATS', 'DEL', {})
+        assert pdstatsd.docker_stats.timeout == procdockerstatsd.DOCKER_API_TIMEOUT_SEC
+
+    def test_collector_config_update(self):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        collector = pdstatsd.collectors['PROCESS_STATS']
+        with patch.object(pdstatsd, 'update_processstats_command'), \
+                patch.object(pdstatsd, 'update_dockerstats_command'), \
+                patch.object(pdstatsd, 'update_fipsstats_command'), \
+                patch.object(pdstatsd, 'update_state_db'):
+            pdstatsd.dispatch_collectors(1000.0)
+            collector.future.result()
+        # Sampled for the history every 30s, published every 120s
+        assert (collector.next_run, collector.next_publish) == (1030.0, 1120.0)
+
+        # A shorter interval applies to the pending wait
+        pdstatsd.collector_config_update('PROCESS_STATS', 'SET', {'interval': '10', 'timeout': '5'})
+        assert (collector.interval, collector.timeout) == (10, 5)
+        assert (collector.next_run, collector.next_publish) == (1010.0, 1010.0)
+
+        with patch.object(pdstatsd, 'log_error') as mock_log_error:
+            pdstatsd.collector_config_update('PROCESS_STATS', 'SET', {'interval': 'often'})
+            pdstatsd.collector_config_update('PROCESS_STATS', 'SET', {'interval': '0'})
+            pdstatsd.collector_config_update('PROCESS_STATS', 'SET', {'history_points': '50'})
+            assert mock_log_error.call_count == 3
+        assert collector.interval == 10
+
+        pdstatsd.collector_config_update('PROCESS_STATS', 'DEL', {})
+        assert (collector.interval, collector.timeout) == (120, 60)
+
+    def make_container_tree(self, root, cid, name, pid, netns='net:[4026532001]'):
+        containers_dir = root / 'containers'
+        cgroup_root = root / 'cgroup'
+        proc_root = root / 'proc'
+        (containers_dir / cid).mkdir(parents=True)
+        (containers_dir / cid / 'config.v2.json').write_text(
+            json.dumps({'ID': cid, 'Name': '/' + name, 'State': {'Running': pid != 0, 'Pid': pid}}))
+        (proc_root / '1' / 'ns').mkdir(parents=True, exist_ok=True)
+        if not (proc_root / '1' / 'ns' / 'net').is_symlink():
+            os.symlink('net:[4026531840]', str(proc_root / '1' / 'ns' / 'net'))
+        if pid:
+            cgroup = cgroup_root / 'system.slice' / 'docker-{}.scope'.format(cid)
+            cgroup.mkdir(parents=True)
+            (cgroup / 'memory.current').write_text('104857600\n')
+            (cgroup / 'memory.stat').write_text('anon 94371840\ninactive_file 4194304\nactive_file 1048576\n')
+            (cgroup / 'memory.max').write_text('max\n')
+            (cgroup / 'cpu.stat').write_text('usage_usec 1000000\nuser_usec 600000\nsystem_usec 400000\n')
+            (cgroup / 'io.stat').write_text('8:0 rbytes=1000 wbytes=2000 rios=1 wios=2\n8:16 rbytes=30 wbytes=40 rios=1 wios=1\n')
+            (cgroup / 'pids.current').write_text('12\n')
+            (proc_root / str(pid) / 'ns').mkdir(parents=True)
+            (proc_root / str(pid) / 'net').mkdir()
+            (proc_root / str(pid) / 'cgroup').write_text('0::/system.slice/docker-{}.scope\n'.format(cid))
+            os.symlink(netns, str(proc_root / str(pid) / 'ns' / 'net'))
+            (proc_root / str(pid) / 'net' / 'dev').write_text(
+                'Inter-|   Receive                            |  Transmit\n'
+                ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n'
+                '    lo:     500       5    0    0    0     0          0         0      500       5    0    0    0     0       0          0\n'
+                '  eth0: 1234567      10    0    0    0     0          0         0   7654321      20    0    0    0     0       0          0\n')
+            return cgroup
+        return None
+
+    def make_sysfs_net(self, root, pid, intf, rx_bytes, rx_packets, tx_bytes, tx_packets):
+        statistics = root / 'proc' / str(pid) / 'root' / 'sys' / 'class' / 'net' / intf / 'statistics'
+        statistics.mkdir(parents=True, exist_ok=True)
+        for name, value in [('rx_bytes', rx_bytes), ('rx_packets', rx_packets),
+                            ('tx_bytes', tx_bytes), ('tx_packets', tx_packets)]:
+            (statistics / name).write_text('{}\n'.format(value))
+
+    def test_cgroup_docker_stats(self, tmp_path):
+        running_id = 'a' * 64
+        stopped_id = 'b' * 64
+        host_id = 'c' * 64
+        cgroup = self.make_container_tree(tmp_path, running_id, 'swss', 100)
+        self.make_container_tree(tmp_path, stopped_id, 'snmp', 0)
+        self.make_container_tree(tmp_path, host_id, 'pmon', 200, netns='net:[4026531840]')
+        collector = procdockerstatsd.CgroupDockerStats(str(tmp_path / 'containers'), str(tmp_path / 'cgroup'),
+                                                       str(tmp_path / 'proc'))
+
+        with patch('procdockerstatsd.time.monotonic', return_value=1000.0), \
+                patch('procdockerstatsd.psutil.virtual_memory') as mock_vmem:
+            mock_vmem.return_value.total = 1048576000
+            stats = collector.collect()
+
+        assert set(stats) == {'DOCKER_STATS|' + 'a' * 12, 'DOCKER_STATS|' + 'b' * 12, 'DOCKER_STATS|' + 'c' * 12}
+        running = stats['DOCKER_STATS|' + 'a' * 12]
+        assert running == {
+            'NAME': 'swss', 'CPU%': '0.00', 'MEM_BYTES': '100663296', 'MEM_LIMIT_BYTES': '1048576000',
+            'MEM%': '9.60', 'NET_IN_BYTES': '1234567', 'NET_OUT_BYTES': '7654321',
+            'BLOCK_IN_BYTES': '1030', 'BLOCK_OUT_BYTES': '2040', 'PIDS': '12', 'NETWORK': 'private'
+        }
+        assert stats['DOCKER_STATS|' + 'b' * 12]['NAME'] == 'snmp'
+        assert stats['DOCKER_STATS|' + 'b' * 12]['MEM_BYTES'] == '0'
+        assert stats['DOCKER_STATS|' + 'b' * 12]['NETWORK'] == 'none'
+        assert stats['DOCKER_STATS|' + 'c' * 12]['NET_IN_BYTES'] == '0'
+        assert stats['DOCKER_STATS|' + 'c' * 12]['NET_OUT_BYTES'] == '0'
+        assert stats['DOCKER_STATS|' + 'c' * 12]['NETWORK'] == 'host'
+        # Without sysfs in the container the interface counters come from /proc/<pid>/net/dev
+        assert collector.netdict == {
+            'DOCKER_NET_STATS|aaaaaaaaaaaa|eth0': {
+                'RX_BYTES': '1234567', 'RX_PACKETS': '10', 'TX_BYTES': '7654321', 'TX_PACKETS': '20',
+                'RX_BPS': '0.00', 'RX_PPS': '0.00', 'TX_BPS': '0.00', 'TX_PPS': '0.00'
+            }
+        }
+
+        # CPU% comes from the usage delta, the container config is not parsed again
+        (cgroup / 'cpu.stat').write_text('usage_usec 4000000\n')
+        (cgroup / 'memory.max').write_text('209715200\n')
+        # The sysfs of the container's network namespace has the exact per interface counters
+        self.make_sysfs_net(tmp_path, 100, 'lo', 100, 1, 100, 1)
+        self.make_sysfs_net(tmp_path, 100, 'eth0', 1244567, 30, 7659321, 25)
+        self.make_sysfs_net(tmp_path, 100, 'eth1', 4000, 4, 0, 0)
+        with patch('procdockerstatsd.time.monotonic', return_value=1010.0), \
+                patch('procdockerstatsd.json.load') as mock_load:
+            stats = collector.collect()
+            mock_load.assert_not_called()
+        running = stats['DOCKER_STATS|' + 'a' * 12]
+        assert running['CPU%'] == '30.00'
+        assert running['MEM_LIMIT_BYTES'] == '209715200'
+        assert running['MEM%'] == '48.00'
+        assert running['NET_IN_BYTES'] == '1248567'
+        assert running['NET_OUT_BYTES'] == '7659321'
+        # Rates over the 10s since the previous collection, new interfaces start at 0
+        assert collector.netdict == {
+            'DOCKER_NET_STATS|aaaaaaaaaaaa|eth0': {
+                'RX_BYTES': '1244567', 'RX_PACKETS': '30', 'TX_BYTES': '7659321', 'TX_PACKETS': '25',
+                'RX_BPS': '1000.00', 'RX_PPS': '2.00', 'TX_BPS': '500.00', 'TX_PPS': '0.50'
+            },
+            'DOCKER_NET_STATS|aaaaaaaaaaaa|eth1': {
+                'RX_BYTES': '4000', 'RX_PACKETS': '4', 'TX_BYTES': '0', 'TX_PACKETS': '0',
+                'RX_BPS': '0.00', 'RX_PPS': '0.00', 'TX_BPS': '0.00', 'TX_PPS': '0.00'
+            }
+        }
+
+        # Removed containers are dropped
+        shutil.rmtree(str(tmp_path / 'containers' / stopped_id))
+        assert 'DOCKER_STATS|' + 'b' * 12 not in collector.collect()
+        assert stopped_id not in collector.containers
+
+    def test_update_dockerstats_command_collector(self):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        pdstatsd.docker_stats = mock.Mock()
+        pdstatsd.docker_stats.collect.return_value = {'DOCKER_STATS|abc': {'NAME': 'swss', 'PIDS': '3'}}
+        pdstatsd.docker_stats.netdict = {'DOCKER_NET_STATS|abc|eth0': {'RX_BYTES': '10', 'RX_BPS': '1.00'}}
+        with patch.object(pdstatsd, 'run_command') as mock_run_command:
+            assert pdstatsd.update_dockerstats_command()
+            mock_run_command.assert_not_called()
+        assert pdstatsd.state_db.get('STATE_DB', 'DOCKER_STATS|abc', 'PIDS') == '3'
+        assert pdstatsd.state_db.get('STATE_DB', 'DOCKER_NET_STATS|abc|eth0', 'RX_BPS') == '1.00'
+
+    def test_docker_api_stats(self, tmp_path):
+        running_id = 'a' * 64
+        stopped_id = 'b' * 64
+        host_id = 'c' * 64
+        cpu_total = [2000000000]
+        requests = []
+        connections = set()
+
+        class DockerApiHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                requests.append(self.path)
+                connections.add(id(self.connection))
+                if self.path == '/containers/json?all=1':
+                    body = [{'Id': running_id, 'Names': ['/swss'], 'State': 'running',
+                             'HostConfig': {'NetworkMode': 'bridge'}},
+                            {'Id': host_id, 'Names': ['/pmon'], 'State': 'running',
+                             'HostConfig': {'NetworkMode': 'host'}},
+                            {'Id': stopped_id, 'Names': ['/snmp'], 'State': 'exited'}]
+                elif self.path == '/containers/{}/stats?stream=false&one-shot=true'.format(host_id):
+                    body = {'pids_stats': {'current': 20}}
+                elif self.path == '/containers/{}/stats?stream=false&one-shot=true'.format(running_id):
+                    body = {
+                        'cpu_stats': {'cpu_usage': {'total_usage': cpu_total[0]},
+                                      'system_cpu_usage': cpu_total[0] * 10, 'online_cpus': 4},
+                        'memory_stats': {'usage': 104857600, 'limit': 1048576000,
+                                         'stats': {'inactive_file': 4194304}},
+                        'networks': {'eth0': {'rx_bytes': 1234567, 'rx_packets': 10,
+                                              'tx_bytes': 7654321, 'tx_packets': 20},
+                                     'eth1': {'rx_bytes': 3, 'rx_packets': 1, 'tx_bytes': 4, 'tx_packets': 1}},
+                        'blkio_stats': {'io_service_bytes_recursive': [
+                            {'major': 8, 'minor': 0, 'op': 'read', 'value': 1000},
+                            {'major': 8, 'minor': 0, 'op': 'write', 'value': 2000}]},
+                        'pids_stats': {'current': 12}
+                    }
+                else:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        socket_path = str(tmp_path / 'docker.sock')
+        server = socketserver.ThreadingUnixStreamServer(socket_path, DockerApiHandler)
+        # The collector keeps its connections open, do not wait for their handlers on close
+        server.daemon_threads = True
+        server.block_on_close = False
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            collector = procdockerstatsd.DockerApiStats(socket_path, workers=2)
+            stats = collector.collect()
+            assert stats['DOCKER_STATS|' + 'a' * 12] == {
+                'NAME': 'swss', 'CPU%': '0.00', 'MEM_BYTES': '100663296', 'MEM_LIMIT_BYTES': '1048576000',
+                'MEM%': '9.60', 'NET_IN_BYTES': '1234570', 'NET_OUT_BYTES': '7654325',
+                'BLOCK_IN_BYTES': '1000', 'BLOCK_OUT_BYTES': '2000', 'PIDS': '12', 'NETWORK': 'private'
+            }
+            assert stats['DOCKER_STATS|' + 'b' * 12]['NAME'] == 'snmp'
+            assert stats['DOCKER_STATS|' + 'b' * 12]['PIDS'] == '0'
+            assert stats['DOCKER_STATS|' + 'c' * 12]['NETWORK'] == 'host'
+            assert stats['DOCKER_STATS|' + 'c' * 12]['PIDS'] == '20'
+            assert set(collector.netdict) == {'DOCKER_NET_STATS|aaaaaaaaaaaa|eth0', 'DOCKER_NET_STATS|aaaaaaaaaaaa|eth1'}
+            assert collector.netdict['DOCKER_NET_STATS|aaaaaaaaaaaa|eth0']['RX_PACKETS'] == '10'
+            # Stopped containers are not queried
+            assert requests.count('/containers/{}/stats?stream=false&one-shot=true'.format(stopped_id)) == 0
+
+            # CPU% from the delta with the previous collection, on the same connections
+            cpu_total[0] += 1000000000
+            stats = collector.collect()
+            assert stats['DOCKER_STATS|' + 'a' * 12]['CPU%'] == '40.00'
+            assert len(requests) == 6
+            assert len(connections) <= 3
+
+            # A new timeout is taken by new connections
+            opened = len(connections)
+            collector.timeout = 5
+            collector.collect()
+            assert len(connections) > opened
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_update_state_db_table_diff(self):
+        MockConnector.data.update({
+            'DOCKER_STATS|stale': {'NAME': 'gone'},
+            'DOCKER_STATS|LastUpdateTime': {'lastupdate': 'now'}
+        })
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        rows = {
+            'DOCKER_STATS|abc': {'NAME': 'swss', 'CPU%': '1.00', 'PIDS': '3'},
+            'DOCKER_STATS|def': {'NAME': 'bgp', 'CPU%': '2.00', 'PIDS': '7'}
+        }
+        pdstatsd.update_state_db_table('DOCKER_STATS', rows)
+        # Keys left by a previous daemon instance are removed, the update time is kept
+        assert 'DOCKER_STATS|stale' not in MockConnector.data
+        assert 'DOCKER_STATS|LastUpdateTime' in MockConnector.data
+        assert MockConnector.data['DOCKER_STATS|def'] == {'NAME': 'bgp', 'CPU%': '2.00', 'PIDS': '7'}
+
+        MockTable.ops = []
+        pdstatsd.update_state_db_table('DOCKER_STATS', {
+            'DOCKER_STATS|abc': {'NAME': 'swss', 'CPU%': '5.00', 'PIDS': '3'},
+            'DOCKER_STATS|ghi': {'NAME': 'lldp', 'CPU%': '0.00', 'PIDS': '2'}
+        })
+        # Unchanged rows are not written, the table is never wiped
+        assert sorted(MockTable.ops) == sorted([('set', 'DOCKER_STATS', 'abc'), ('set', 'DOCKER_STATS', 'ghi'),
+                                                ('del', 'DOCKER_STATS', 'def'), ('flush', 'DOCKER_STATS', None)])
+        assert MockConnector.data['DOCKER_STATS|abc'] == {'NAME': 'swss', 'CPU%': '5.00', 'PIDS': '3'}
+        assert 'DOCKER_STATS|def' not in MockConnector.data
+
+        MockTable.ops = []
+        pdstatsd.update_state_db_table('DOCKER_STATS', {
+            'DOCKER_STATS|abc': {'NAME': 'swss', 'CPU%': '5.00', 'PIDS': '3'},
+            'DOCKER_STATS|ghi': {'NAME': 'lldp', 'CPU%': '0.00', 'PIDS': '2'}
+        })
+        assert MockTable.ops == [('flush', 'DOCKER_STATS', None)]
+
+    def test_update_state_db_table_single_flush(self):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        for cpu in ['1.0', '2.0']:
+            MockTable.ops = []
+            pdstatsd.update_state_db_table('PROCESS_STATS', {
+                'PROCESS_STATS|{}'.format(pid): {'%CPU': cpu} for pid in range(1, 1025)})
+            # The whole update goes out in one flush, the pipeline never flushes by itself in between
+            assert [op for op, _, _ in MockTable.ops if op not in ('set', 'del')] == ['flush']
+        tbl, size = pdstatsd.state_tables['PROCESS_STATS']
+        assert size > 1024
+        assert tbl.pipeline.size == size
+
+        # A smaller update reuses the pipeline
+        pdstatsd.update_state_db_table('PROCESS_STATS', {'PROCESS_STATS|1': {'%CPU': '3.0'}})
+        assert pdstatsd.state_tables['PROCESS_STATS'][0] is tbl
+
+    def test_stats_history(self):
+        history = procdockerstatsd.StatsHistory('PROCESS_STATS', ['%CPU', '%MEM'], top=2)
+        history.configure({'history_size': 3, 'history_points': 2, 'history_max_series': 5})
+        for cpu in ['10.0', '50.5', '20.0', '30.0']:
+            history.record({
+                'PROCESS_STATS|1': {'%CPU': cpu, '%MEM': '1.0'},
+                'PROCESS_STATS|2': {'%CPU': '0.0', '%MEM': 'n/a'},
+                'PROCESS_STATS|3': {'%CPU': '0.0', '%MEM': '2.0'}
+            })
+        # The oldest sample is overwritten, only the top 2 rows and the numeric values are kept
+        assert history.summary() == {
+            'PROCESS_STATS_HISTORY|1': {
+                '%CPU_MIN': '20', '%CPU_MAX': '50.50', '%CPU_AVG': '33.50', '%CPU_LAST': '20,30',
+                '%MEM_MIN': '1', '%MEM_MAX': '1', '%MEM_AVG': '1', '%MEM_LAST': '1,1'
+            },
+            'PROCESS_STATS_HISTORY|2': {
+                '%CPU_MIN': '0', '%CPU_MAX': '0', '%CPU_AVG': '0', '%CPU_LAST': '0,0'
+            }
+        }
+
+        # The number of series is bounded, series not sampled for a whole buffer are dropped
+        for _ in range(3):
+            history.record({'PROCESS_STATS|{}'.format(pid): {'%CPU': '1.0', '%MEM': '1.0'} for pid in [4, 5]})
+        assert len(history.series) <= 5
+        assert ('PROCESS_STATS|1', '%CPU') not in history.series
+        assert sorted(history.summary()) == ['PROCESS_STATS_HISTORY|4', 'PROCESS_STATS_HISTORY|5']
+
+    def test_history_sampled_between_publishes(self):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        pdstatsd.docker_stats = mock.Mock()
+        cpu = iter(['1.00', '90.00', '2.00', '3.00', '4.00'])
+        pdstatsd.docker_stats.collect.side_effect = lambda: {
+            'DOCKER_STATS|abc': {'NAME': 'swss', 'CPU%': next(cpu), 'MEM_BYTES': '100'}}
+        pdstatsd.docker_stats.netdict = {}
+        collector = pdstatsd.collectors['DOCKER_STATS']
+
+        for now in [1000.0, 1030.0, 1060.0, 1090.0, 1120.0]:
+            pdstatsd.dispatch_collectors(now)
+            collector.future.result()
+            if now == 1090.0:
+                # Only sampled so far, the spike is not published yet
+                assert pdstatsd.state_db.get('STATE_DB', 'DOCKER_STATS|abc', 'CPU%') == '1.00'
+                assert MockConnector.data['DOCKER_STATS_HISTORY|abc']['CPU%_LAST'] == '1'
+
+        assert pdstatsd.docker_stats.collect.call_count == 5
+        assert pdstatsd.state_db.get('STATE_DB', 'DOCKER_STATS|abc', 'CPU%') == '4.00'
+        assert MockConnector.data['DOCKER_STATS_HISTORY|abc'] == {
+            'CPU%_MIN': '1', 'CPU%_MAX': '90', 'CPU%_AVG': '20', 'CPU%_LAST': '90,2,3,4',
+            'MEM_BYTES_MIN': '100', 'MEM_BYTES_MAX': '100', 'MEM_BYTES_AVG': '100', 'MEM_BYTES_LAST': '100,100,100,100'
+        }
+
+    def test_history_sample_cost(self, tmp_path):
+        pdstatsd = procdockerstatsd.ProcDockerStats(procdockerstatsd.SYSLOG_IDENTIFIER)
+        scanner = pdstatsd.process_scanner = procdockerstatsd.ProcessStatsScanner(str(tmp_path))
+        scanner.clock_ticks = 100
+        for pid in range(10, 20):
+            make_proc_entry(tmp_path, pid, 'proc', 1, 0, 0, 0, pid, 10, ['proc{}'.format(pid)])
+        with patch('procdockerstatsd.time.monotonic', return_value=100.0):
+            scanner.scan(3)
+        for pid in range(10, 20):
+            make_proc_entry(tmp_path, pid, 'proc', 1, 0, pid * 10, 0, pid, 10, ['proc{}'.format(pid)])
+
+        opened = []
+        real_open = open
+
+        def tracking_open(path, *args, **kwargs):
+            opened.append(path)
+            return real_open(path, *args, **kwargs)
+
+        with patch.object(procdockerstatsd, 'HISTORY_TOP_PROCESSES', 3), \
+                patch('procdockerstatsd.time.monotonic', return_value=110.0), \
+                patch('builtins.open', side_effect=tracking_open), \
+                patch.object(pdstatsd, 'update_state_db_table') as mock_update:
+            pdstatsd.update_processstats_command(publish=False)
+        # Neither status nor cmdline is read, only the history of the top processes is kept
+        assert not [path for path in opened if path.endswith('status') or path.endswith('cmdline')]
+        mock_update.assert_not_called()
+        assert sorted(pdstatsd.histories['PROCESS_STATS'].series) == [
+            ('PROCESS_STATS|{}'.format(pid), field) for pid in (17, 18, 19) for field in ('%CPU', '%MEM')]
+        assert pdstatsd.histories['PROCESS_STATS'].series[('PROCESS_STATS|19', '%CPU')].values() == [19.0]
+
+        # No 'docker stats' run for a sample
+        pdstatsd.docker_stats = None
+        with patch.object(pdstatsd, 'run_command') as mock_run_command:
+            assert pdstatsd.update_dockerstats_command(publish=False)
+            mock_run_command.assert_not_called()
+        assert not pdstatsd.histories['DOCKER_STATS'].series
+
+    def test_parity_harness(self):
+        output = subprocess.check_output([sys.executable, '-m', 'tests.procdockerstatsd_parity', '--json',
+                                          '--processes', '20', '--containers', '3',
+                                          '--rust-bin', os.path.join(test_path, 'no-such-binary')],
+                                         cwd=modules_path, universal_newlines=True)
+        report = json.loads(output)
+        python = report['python']
+        assert len([key for key in python['db'] if key.startswith('DOCKER_STATS|')]) == 3
+        assert len([key for key in python['db'] if key.startswith('PROCESS_STATS|')]) == 20
+        assert python['db']['PROCESS_STATS|7']['CMD'] == '/usr/bin/proc7 --id 7'
+        # The collector the daemon deploys, not the docker CLI
+        assert python['collector'] == 'CgroupDockerStats'
+        assert python['db']['DOCKER_STATS|c0ffee000001']['MEM_LIMIT_BYTES'] == '8322572878'
+        assert python['db']['DOCKER_STATS|c0ffee000001']['NETWORK'] == 'host'
+        assert python['db']['DOCKER_STATS|c0ffee000000']['NET_IN_BYTES'] == '100'
+        assert sorted(key for key in python['db'] if key.startswith('DOCKER_NET_STATS|')) == [
+            'DOCKER_NET_STATS|c0ffee000000|eth0', 'DOCKER_NET_STATS|c0ffee000002|eth0']
+        # One keys read and one pipeline flush per table instead of one write per row: DOCKER_STATS,
+        # DOCKER_NET_STATS, PROCESS_STATS and their two history tables
+        assert python['ops']['table.flush'] == 5
+        assert python['round_trips'] <= 2 * 5
+        assert 'rust_skipped' in report
+
+    def test_parity_compare(self):
+        from tests import procdockerstatsd_parity
+        python_db = {'DOCKER_STATS|abc': {'NAME': 'swss', 'NETWORK': 'private'},
+                     'DOCKER_STATS|LastUpdateTime': {'lastupdate': 'now'},
+                     'DOCKER_NET_STATS|abc|eth0': {'RX_BYTES': '1'},
+                     'PROCESS_STATS|1': {'CMD': 'init'}}
+        rust_db = {'DOCKER_STATS|abc': {'NAME': 'swss'},
+                   'PROCESS_STATS|1': {'CMD': 'init'},
+                   'PROCESS_STATS|2': {'CMD': 'bash'}}
+        assert procdockerstatsd_parity.compare(python_db, rust_db) == [
+            'DOCKER_NET_STATS: table only published by Python',
+            "DOCKER_STATS|abc: fields only in Python ['NETWORK'], only in Rust []",
+            'PROCESS_STATS|2: only published by Rust'
+        ]